@@ -2,10 +2,17 @@
 Clone of 2048 game.
 """
 import random
-import poc_2048_gui
+import time
+from collections import OrderedDict, deque
+from itertools import product
 
 UP, DOWN, LEFT, RIGHT = 1, 2, 3, 4
 
+# Lines up to this length are merged from a table of every line of
+# tiles up to 2048, built once per length; longer lines, whose table
+# would hold 248832 lines, go through the LRU cache.
+PRECOMPUTE_WIDTH = 4
+
 OFFSETS = {
     UP:    (1,  0),
     DOWN:  (-1, 0),
@@ -31,11 +38,63 @@ def merge(line):
             idx += 1
     return result
 
+class MergeCache:
+    """
+    Memoized merge keyed on the tuple of tiles.
+
+    Lines of precomputed widths are answered from a permanent table,
+    any other line goes through a bounded LRU cache.
+    """
+    def __init__(self, maxsize=4096):
+        self._maxsize = maxsize
+        self._table = {}
+        self._precomputed = {}
+        self._cache = OrderedDict()
+
+    def precompute(self, width, max_value=2048):
+        """
+        Fill the table with every line of the given width made of
+        tiles up to max_value, unless that was already done.
+        """
+        if self._precomputed.get(width, 0) >= max_value:
+            return
+        self._precomputed[width] = max_value
+        values = [0]
+        while values[-1] * 2 <= max_value:
+            values.append(values[-1] * 2 if values[-1] else 2)
+        for line in product(values, repeat=width):
+            merged = tuple(merge(line))
+            self._table[line] = merged, merged != line
+
+    def merge(self, line):
+        """
+        Return the merged line as a tuple together with a flag
+        telling whether it differs from the given line.
+        """
+        key = tuple(line)
+        result = self._table.get(key)
+        if result is not None:
+            return result
+        result = self._cache.pop(key, None)
+        if result is None:
+            merged = tuple(merge(key))
+            result = merged, merged != key
+            if len(self._cache) >= self._maxsize:
+                self._cache.popitem(last=False)
+        self._cache[key] = result
+        return result
+
+MERGE_CACHE = MergeCache()
+
 class TwentyFortyEight:
     """
     Class to run the game logic.
+
+    With a positive undo_limit the last undo_limit moves can be
+    undone, each recorded as the lines it changed and the new tile.
     """
-    def __init__(self, grid_height, grid_width):
+    def __init__(self, grid_height, grid_width, undo_limit=0):
+        self._undo = deque(maxlen=undo_limit) if undo_limit else None
         self._height = grid_height
         self._width = grid_width
         self._initial = {
@@ -44,6 +103,16 @@ class TwentyFortyEight:
             LEFT:  [(idx,                0) for idx in range(self._height)],
             RIGHT: [(idx,  self._width - 1) for idx in range(self._height)],
         }
+        self._lines = {}
+        for direction, initial in self._initial.items():
+            delta = OFFSETS[direction]
+            length = self._height if direction in { UP, DOWN } else self._width
+            self._lines[direction] = [[(pos[0] + delta[0] * idx,
+                pos[1] + delta[1] * idx) for idx in range(length)]
+                for pos in initial]
+        for length in set((grid_height, grid_width)):
+            if length <= PRECOMPUTE_WIDTH:
+                MERGE_CACHE.precompute(length)
         self.reset()
 
     def reset(self):
@@ -52,6 +121,9 @@ class TwentyFortyEight:
         initial tiles.
         """
         self._grid = [[0] * self._width for _ in range(self._height)]
+        self._index_empty()
+        if self._undo is not None:
+            self._undo.clear()
         for _ in range(2):
             self.new_tile()
 
@@ -61,6 +133,32 @@ class TwentyFortyEight:
         """
         return str(self._grid)
 
+    def _index_empty(self):
+        """
+        Rebuild the index of empty squares from the grid.
+        """
+        self._empty = [(row, col) for row in range(self._height)
+            for col in range(self._width) if not self._grid[row][col]]
+        self._empty_index = dict((pos, idx)
+            for idx, pos in enumerate(self._empty))
+
+    def _add_empty(self, pos):
+        """
+        Record that the square at pos became empty.
+        """
+        self._empty_index[pos] = len(self._empty)
+        self._empty.append(pos)
+
+    def _remove_empty(self, pos):
+        """
+        Record that the square at pos is no longer empty.
+        """
+        idx = self._empty_index.pop(pos)
+        last = self._empty.pop()
+        if idx < len(self._empty):
+            self._empty[idx] = last
+            self._empty_index[last] = idx
+
     def get_grid_height(self):
         """
         Get the height of the board.
@@ -77,50 +175,154 @@ class TwentyFortyEight:
         """
         Move all tiles in the given direction and add
         a new tile if any tiles moved.
+        Returns False if no moves are left afterwards.
         """
-        delta = OFFSETS[direction]
-        length = self._height if direction in { UP, DOWN } else self._width
-        temporary = [0] * length
-        changed = False
-        for pos in self._initial[direction]:
-            for idx in range(length):
-                temporary[idx] = \
-                    self._grid[pos[0] + delta[0] * idx][pos[1] + delta[1] * idx]
-            temporary = merge(temporary)
-            for idx in range(length):
-                prev = self._grid[pos[0] + delta[0] * idx][pos[1] + delta[1] * idx]
-                changed |= prev != temporary[idx]
-                self._grid[pos[0] + delta[0] * idx][pos[1] + delta[1] * idx] = \
-                    temporary[idx]
+        grid = self._grid
+        changed = []
+        for cells in self._lines[direction]:
+            prev_line = [grid[row][col] for row, col in cells]
+            line, line_changed = MERGE_CACHE.merge(prev_line)
+            if not line_changed:
+                continue
+            changed.append((cells, prev_line))
+            for (row, col), value in zip(cells, line):
+                prev = grid[row][col]
+                if prev == value:
+                    continue
+                grid[row][col] = value
+                if not prev:
+                    self._remove_empty((row, col))
+                elif not value:
+                    self._add_empty((row, col))
         if changed:
-            self.new_tile()
+            pos = self.new_tile()
+            if self._undo is not None:
+                self._undo.append((changed, pos))
+        return self.has_moves()
+
+    def undo(self):
+        """
+        Undo the last recorded move.
+        Returns False if there is no move to undo.
+        """
+        if not self._undo:
+            return False
+        changed, pos = self._undo.pop()
+        if pos is not None:
+            self.set_tile(pos[0], pos[1], 0)
+        for cells, line in changed:
+            for (row, col), value in zip(cells, line):
+                self.set_tile(row, col, value)
+        return True
+
+    def snapshot(self):
+        """
+        Return the grid encoded as bytes, one base two logarithm of
+        a tile (zero for an empty square) per square.
+        """
+        return bytes(bytearray(value.bit_length() - 1 if value else 0
+            for row in self._grid for value in row))
+
+    def restore(self, snapshot):
+        """
+        Restore the grid from a value returned by snapshot, clearing
+        the undo history.
+        """
+        data = bytearray(snapshot)
+        assert len(data) == self._height * self._width, \
+            'snapshot does not match the grid size'
+        self._grid = [[1 << exponent if exponent else 0
+            for exponent in data[row : row + self._width]]
+            for row in range(0, len(data), self._width)]
+        self._index_empty()
+        if self._undo is not None:
+            self._undo.clear()
+
+    def has_moves(self):
+        """
+        Check whether any move would change the grid.
+        """
+        if self._empty:
+            return len(self._empty) < self._height * self._width
+        grid = self._grid
+        for row in range(self._height):
+            for col in range(self._width):
+                value = grid[row][col]
+                if col + 1 < self._width and grid[row][col + 1] == value:
+                    return True
+                if row + 1 < self._height and grid[row + 1][col] == value:
+                    return True
+        return False
+
+    def can_move(self, direction):
+        """
+        Check whether moving in the given direction would change the
+        grid, without changing it.
+        """
+        grid = self._grid
+        for cells in self._lines[direction]:
+            prev, seen_empty = 0, False
+            for row, col in cells:
+                value = grid[row][col]
+                if not value:
+                    seen_empty = True
+                elif seen_empty or value == prev:
+                    return True
+                else:
+                    prev = value
+        return False
+
+    def legal_moves(self):
+        """
+        Return the list of directions that would change the grid.
+        """
+        return [direction for direction in (UP, DOWN, LEFT, RIGHT)
+            if self.can_move(direction)]
+
+    def is_game_over(self):
+        """
+        Check whether no move would change the grid.
+        """
+        return not self.has_moves()
+
+    def peek(self, direction):
+        """
+        Return the grid that moving in the given direction would
+        produce, without changing the game or adding a new tile.
+        """
+        grid = [list(row) for row in self._grid]
+        for cells in self._lines[direction]:
+            line, line_changed = MERGE_CACHE.merge(
+                [grid[row][col] for row, col in cells])
+            if line_changed:
+                for (row, col), value in zip(cells, line):
+                    grid[row][col] = value
+        return grid
 
     def new_tile(self):
         """
         Create a new tile in a randomly selected empty
         square.  The tile should be 2 90% of the time and
         4 10% of the time.
+        Returns the position of the new tile.
         """
-        empty_count = 0
-        for row in range(self._height):
-            empty_count += self._grid[row].count(0)
-        if empty_count == 0:
-            return
-        square_index = random.randint(0, empty_count - 1)
-        for row in range(self._height):
-            for col in range(self._width):
-                if self._grid[row][col] != 0:
-                    continue
-                if square_index == 0:
-                    self._grid[row][col] = 2 if random.randint(0, 9) != 9 else 4
-                    return
-                square_index -= 1
+        if not self._empty:
+            return None
+        row, col = self._empty[random.randint(0, len(self._empty) - 1)]
+        self._grid[row][col] = 2 if random.randint(0, 9) != 9 else 4
+        self._remove_empty((row, col))
+        return row, col
 
     def set_tile(self, row, col, value):
         """
         Set the tile at position row, col to have the given value.
         """
+        prev = self._grid[row][col]
         self._grid[row][col] = value
+        if not prev and value:
+            self._remove_empty((row, col))
+        elif prev and not value:
+            self._add_empty((row, col))
 
     def get_tile(self, row, col):
         """
@@ -128,4 +330,391 @@ class TwentyFortyEight:
         """
         return self._grid[row][col]
 
-poc_2048_gui.run_gui(TwentyFortyEight(4, 4))
+class TwentyFortyEightBitboard:
+    """
+    Game logic for the 4x4 board packed into a single 64-bit integer.
+
+    Every cell is a nibble holding the base two logarithm of its tile
+    (zero for an empty cell), row-major from the least significant
+    nibble.  Moves are applied with precomputed row and column tables,
+    tiles saturate at 32768.
+    """
+    def __init__(self, grid_height=4, grid_width=4):
+        assert grid_height == 4 and grid_width == 4, \
+            'bitboard supports only 4x4 grid'
+        self._board = 0
+        self.reset()
+
+    def reset(self):
+        """
+        Reset the game so the grid is empty except for two
+        initial tiles.
+        """
+        self._board = 0
+        for _ in range(2):
+            self.new_tile()
+
+    def __str__(self):
+        """
+        Return a string representation of the grid for debugging.
+        """
+        return str([[self.get_tile(row, col) for col in range(4)]
+            for row in range(4)])
+
+    def get_grid_height(self):
+        """
+        Get the height of the board.
+        """
+        return 4
+
+    def get_grid_width(self):
+        """
+        Get the width of the board.
+        """
+        return 4
+
+    def get_board(self):
+        """
+        Return the packed 64-bit board.
+        """
+        return self._board
+
+    def snapshot(self):
+        """
+        Return the packed 64-bit board.
+        """
+        return self._board
+
+    def restore(self, snapshot):
+        """
+        Restore the board from a value returned by snapshot.
+        """
+        self._board = snapshot
+
+    def move(self, direction):
+        """
+        Move all tiles in the given direction and add
+        a new tile if any tiles moved.
+        Returns False if no moves are left afterwards.
+        """
+        board = bitboard_move(self._board, direction)
+        if board != self._board:
+            self._board = board
+            self.new_tile()
+        return self.has_moves()
+
+    def has_moves(self):
+        """
+        Check whether any move would change the board.
+
+        A board with tiles and an empty cell always has a move; the
+        empty cell is found with a bit test on all nibbles at once.
+        """
+        board = self._board
+        if board and (board - 0x1111111111111111) & ~board & 0x8888888888888888:
+            return True
+        for direction in (UP, DOWN, LEFT, RIGHT):
+            if bitboard_move(self._board, direction) != self._board:
+                return True
+        return False
+
+    def can_move(self, direction):
+        """
+        Check whether moving in the given direction would change the
+        board, without changing it.
+        """
+        return bitboard_move(self._board, direction) != self._board
+
+    def legal_moves(self):
+        """
+        Return the list of directions that would change the board.
+        """
+        return [direction for direction in (UP, DOWN, LEFT, RIGHT)
+            if self.can_move(direction)]
+
+    def is_game_over(self):
+        """
+        Check whether no move would change the board.
+        """
+        return not self.has_moves()
+
+    def peek(self, direction):
+        """
+        Return the grid that moving in the given direction would
+        produce, without changing the game or adding a new tile.
+        """
+        board = bitboard_move(self._board, direction)
+        grid = []
+        for row in range(4):
+            grid.append([])
+            for shift in range(16 * row, 16 * row + 16, 4):
+                exponent = (board >> shift) & 0xF
+                grid[row].append(1 << exponent if exponent else 0)
+        return grid
+
+    def new_tile(self):
+        """
+        Create a new tile in a randomly selected empty
+        square.  The tile should be 2 90% of the time and
+        4 10% of the time.
+        """
+        empty = [shift for shift in range(0, 64, 4)
+            if not (self._board >> shift) & 0xF]
+        if not empty:
+            return
+        shift = empty[random.randint(0, len(empty) - 1)]
+        self._board |= (1 if random.randint(0, 9) != 9 else 2) << shift
+
+    def set_tile(self, row, col, value):
+        """
+        Set the tile at position row, col to have the given value.
+        """
+        exponent = value.bit_length() - 1 if value else 0
+        assert 0 <= exponent < 16, 'tile is out of range: ' + str(value)
+        shift = 4 * (4 * row + col)
+        self._board = self._board & ~(0xF << shift) | exponent << shift
+
+    def get_tile(self, row, col):
+        """
+        Return the value of the tile at position row, col.
+        """
+        exponent = (self._board >> 4 * (4 * row + col)) & 0xF
+        return 1 << exponent if exponent else 0
+
+def _bitboard_tables():
+    """
+    Build once and return the tables used by bitboard_move.
+
+    Each table maps a packed 16-bit line to the xor of that line with
+    its merged result, row tables keep the line packed as a row while
+    column tables spread its nibbles 16 bits apart.
+    """
+    if _BITBOARD_TABLES:
+        return _BITBOARD_TABLES
+
+    def merge_row(row, reverse):
+        """
+        Merge a packed row towards its first (or last) nibble.
+        """
+        line = [(row >> shift) & 0xF for shift in range(0, 16, 4)]
+        if reverse:
+            line.reverse()
+        line = merge([1 << exponent if exponent else 0 for exponent in line])
+        line = [min(value.bit_length() - 1, 15) if value else 0
+            for value in line]
+        if reverse:
+            line.reverse()
+        result = 0
+        for idx, exponent in enumerate(line):
+            result |= exponent << 4 * idx
+        return result
+
+    def spread(row):
+        """
+        Turn a packed row into a packed column.
+        """
+        return (row & 0xF) | (row & 0xF0) << 12 | \
+            (row & 0xF00) << 24 | (row & 0xF000) << 36
+
+    tables = dict((direction, [0] * 65536)
+        for direction in (UP, DOWN, LEFT, RIGHT))
+    for row in range(65536):
+        left = row ^ merge_row(row, False)
+        right = row ^ merge_row(row, True)
+        tables[LEFT][row], tables[RIGHT][row] = left, right
+        tables[UP][row], tables[DOWN][row] = spread(left), spread(right)
+    _BITBOARD_TABLES.update(tables)
+    return _BITBOARD_TABLES
+
+_BITBOARD_TABLES = {}
+
+def bitboard_move(board, direction):
+    """
+    Return the packed board after moving all tiles in the given
+    direction, no new tile is added.
+    """
+    table = _bitboard_tables()[direction]
+    if direction in (LEFT, RIGHT):
+        for shift in range(0, 64, 16):
+            board ^= table[(board >> shift) & 0xFFFF] << shift
+    else:
+        for shift in range(0, 16, 4):
+            column = board >> shift
+            column = (column & 0xF) | (column >> 12) & 0xF0 | \
+                (column >> 24) & 0xF00 | (column >> 36) & 0xF000
+            board ^= table[column] << shift
+    return board
+
+def to_bitboard(game):
+    """
+    Pack the tiles of a 4x4 game into a 64-bit board.
+    """
+    board = 0
+    for row in range(4):
+        for col in range(4):
+            value = game.get_tile(row, col)
+            if value:
+                board |= (value.bit_length() - 1) << 4 * (4 * row + col)
+    return board
+
+def _heuristic_table():
+    """
+    Build once and return the heuristic value of every packed row,
+    rewarding empty cells, mergeable neighbours and monotonic lines.
+    """
+    if _HEURISTIC_TABLE:
+        return _HEURISTIC_TABLE
+    for row in range(65536):
+        line = [(row >> shift) & 0xF for shift in range(0, 16, 4)]
+        empty = line.count(0)
+        merges, previous, counter = 0, 0, 0
+        for exponent in line:
+            if not exponent:
+                continue
+            if exponent == previous:
+                counter += 1
+            elif counter:
+                merges += 1 + counter
+                counter = 0
+            previous = exponent
+        if counter:
+            merges += 1 + counter
+        ascending, descending = 0.0, 0.0
+        for idx in range(3):
+            low, high = line[idx] ** 4.0, line[idx + 1] ** 4.0
+            if line[idx] > line[idx + 1]:
+                ascending += low - high
+            else:
+                descending += high - low
+        _HEURISTIC_TABLE.append(200000.0 + 270.0 * empty + 700.0 * merges -
+            47.0 * min(ascending, descending) -
+            11.0 * sum(exponent ** 3.5 for exponent in line))
+    return _HEURISTIC_TABLE
+
+_HEURISTIC_TABLE = []
+
+# Value of a board without moves for ExpectimaxPlayer, below the
+# heuristic value of any board.
+GAME_OVER_SCORE = -1e12
+
+class _SearchTimeout(Exception):
+    """
+    Raised when the search runs out of its time budget.
+    """
+
+class ExpectimaxPlayer:
+    """
+    Depth-limited expectimax player for the 4x4 game.
+
+    Max nodes try every direction with bitboard_move, chance nodes
+    average over the empty cells and the 90%/10% split between 2 and
+    4 used by new_tile.  Chance nodes reached with a probability below
+    min_probability are evaluated with the heuristic instead of being
+    expanded.  With a time_limit in milliseconds the search deepens
+    iteratively and returns the move of the deepest completed depth.
+    """
+    def __init__(self, depth=3, min_probability=0.0001, time_limit=None):
+        self._depth = depth
+        self._min_probability = min_probability
+        self._time_limit = time_limit
+        self._deadline = None
+        self._table = {}
+        self._heuristic = _heuristic_table()
+
+    def get_move(self, game):
+        """
+        Return the best direction for the given game or None if
+        no direction changes the board.
+        """
+        board = to_bitboard(game)
+        self._table = {}
+        self._deadline = None
+        depths = [self._depth]
+        if self._time_limit is not None:
+            self._deadline = time.time() + self._time_limit / 1000.0
+            depths = range(1, self._depth + 1)
+        best_move = None
+        for depth in depths:
+            try:
+                move = self._best_move(board, depth)
+            except _SearchTimeout:
+                break
+            if move is None:
+                return None
+            best_move = move
+        if best_move is None:
+            for direction in (UP, DOWN, LEFT, RIGHT):
+                if bitboard_move(board, direction) != board:
+                    return direction
+        return best_move
+
+    def _best_move(self, board, depth):
+        """
+        Return the direction with the highest expected value.
+        """
+        best_score, best_move = None, None
+        for direction in (UP, DOWN, LEFT, RIGHT):
+            moved = bitboard_move(board, direction)
+            if moved == board:
+                continue
+            score = self._chance_node(moved, depth, 1.0)
+            if best_score is None or score > best_score:
+                best_score, best_move = score, direction
+        return best_move
+
+    def _max_node(self, board, depth, probability):
+        """
+        Return the value of the best move, GAME_OVER_SCORE if there
+        is none.
+        """
+        best = None
+        for direction in (UP, DOWN, LEFT, RIGHT):
+            moved = bitboard_move(board, direction)
+            if moved != board:
+                score = self._chance_node(moved, depth, probability)
+                if best is None or score > best:
+                    best = score
+        return GAME_OVER_SCORE if best is None else best
+
+    def _chance_node(self, board, depth, probability):
+        """
+        Return the expected value over all tiles new_tile could add.
+        """
+        if depth == 0 or probability < self._min_probability:
+            return self._evaluate(board)
+        entry = self._table.get(board)
+        if entry is not None and entry[0] >= depth:
+            return entry[1]
+        if self._deadline is not None and time.time() > self._deadline:
+            raise _SearchTimeout()
+
+        empty = [shift for shift in range(0, 64, 4)
+            if not (board >> shift) & 0xF]
+        probability /= len(empty)
+        total = 0.0
+        for shift in empty:
+            total += 0.9 * self._max_node(board | 1 << shift, depth - 1,
+                0.9 * probability)
+            total += 0.1 * self._max_node(board | 2 << shift, depth - 1,
+                0.1 * probability)
+        total /= len(empty)
+        self._table[board] = depth, total
+        return total
+
+    def _evaluate(self, board):
+        """
+        Heuristic value of the board summed over rows and columns.
+        """
+        heuristic = self._heuristic
+        score = 0.0
+        for shift in range(0, 64, 16):
+            score += heuristic[(board >> shift) & 0xFFFF]
+        for shift in range(0, 16, 4):
+            column = board >> shift
+            score += heuristic[(column & 0xF) | (column >> 12) & 0xF0 |
+                (column >> 24) & 0xF00 | (column >> 36) & 0xF000]
+        return score
+
+if __name__ == "__main__":
+    import poc_2048_gui
+    poc_2048_gui.run_gui(TwentyFortyEight(4, 4))
@@ -0,0 +1,175 @@
+"""
+Batched 2048 simulator playing many boards at once with NumPy.
+"""
+import numpy as np
+from poc_2048 import UP, DOWN, LEFT, RIGHT
+
+def _to_left(grids, direction):
+    """
+    Orient the grids so that moving in the given direction
+    becomes moving left.
+    """
+    if direction == RIGHT:
+        return grids[..., ::-1]
+    if direction == UP:
+        return grids.transpose(0, 2, 1)
+    if direction == DOWN:
+        return grids.transpose(0, 2, 1)[..., ::-1]
+    return grids
+
+def _from_left(grids, direction):
+    """
+    Undo the orientation applied by _to_left.
+    """
+    if direction == RIGHT:
+        return grids[..., ::-1]
+    if direction == UP:
+        return grids.transpose(0, 2, 1)
+    if direction == DOWN:
+        return grids[..., ::-1].transpose(0, 2, 1)
+    return grids
+
+def _compact(lines):
+    """
+    Slide the non-zero tiles of every line to its start keeping
+    their order.
+    """
+    order = np.argsort(lines == 0, axis=-1, kind='stable')
+    return np.take_along_axis(lines, order, axis=-1)
+
+def merge_left(lines):
+    """
+    Merge every line along the last axis towards its start.
+
+    Returns the merged lines and, per grid, the sum of the tiles
+    created by merging.
+    """
+    lines = _compact(lines)
+    gained = np.zeros(lines.shape[0], dtype=lines.dtype)
+    for idx in range(lines.shape[-1] - 1):
+        pair = (lines[..., idx] != 0) & (lines[..., idx] == lines[..., idx + 1])
+        lines[..., idx] = np.where(pair, 2 * lines[..., idx], lines[..., idx])
+        lines[..., idx + 1] = np.where(pair, 0, lines[..., idx + 1])
+        gained += (lines[..., idx] * pair).reshape(lines.shape[0], -1).sum(axis=1)
+    return _compact(lines), gained
+
+class BatchTwentyFortyEight:
+    """
+    Many independent games held in one array of shape
+    (count, grid_height, grid_width).
+    """
+    def __init__(self, count, grid_height, grid_width, seed=None):
+        self._count = count
+        self._height = grid_height
+        self._width = grid_width
+        self._rng = np.random.default_rng(seed)
+        self._grid = np.zeros((count, grid_height, grid_width), dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        """
+        Reset every game so its grid is empty except for two
+        initial tiles.
+        """
+        self._grid[...] = 0
+        for _ in range(2):
+            self.new_tile()
+
+    def __str__(self):
+        """
+        Return a string representation of the grids for debugging.
+        """
+        return str(self._grid)
+
+    def get_count(self):
+        """
+        Get the number of games.
+        """
+        return self._count
+
+    def get_grid_height(self):
+        """
+        Get the height of the boards.
+        """
+        return self._height
+
+    def get_grid_width(self):
+        """
+        Get the width of the boards.
+        """
+        return self._width
+
+    def get_grids(self):
+        """
+        Return the array of all grids, changes to it affect the games.
+        """
+        return self._grid
+
+    def move(self, directions):
+        """
+        Move all tiles of every game in its direction, given as one
+        direction or one per game, and add a new tile to the games
+        where any tiles moved.
+
+        Returns the boolean mask of the changed games and the score
+        gained by each game.
+        """
+        directions = np.broadcast_to(np.asarray(directions), (self._count,))
+        changed = np.zeros(self._count, dtype=bool)
+        score = np.zeros(self._count, dtype=self._grid.dtype)
+        for direction in (UP, DOWN, LEFT, RIGHT):
+            index = np.flatnonzero(directions == direction)
+            if not index.size:
+                continue
+            grids = self._grid[index]
+            merged, gained = merge_left(_to_left(grids, direction))
+            merged = _from_left(merged, direction)
+            changed[index] = (merged != grids).reshape(index.size, -1).any(axis=1)
+            self._grid[index] = merged
+            score[index] = gained
+        self.new_tile(changed)
+        return changed, score
+
+    def new_tile(self, mask=None):
+        """
+        Create a new tile in a randomly selected empty square of
+        every game, or of the games selected by the boolean mask.
+        The tile should be 2 90% of the time and 4 10% of the time.
+        """
+        flat = self._grid.reshape(self._count, -1)
+        empty = flat == 0
+        keys = np.where(empty, self._rng.random(flat.shape), -1.0)
+        selected = empty.any(axis=1)
+        if mask is not None:
+            selected &= mask
+        games = np.flatnonzero(selected)
+        cells = keys[games].argmax(axis=1)
+        flat[games, cells] = np.where(self._rng.random(games.size) < 0.9, 2, 4)
+
+    def has_moves(self):
+        """
+        Return the boolean mask of the games where any move would
+        change the grid.
+        """
+        grid = self._grid
+        empty = (grid == 0).reshape(self._count, -1)
+        pairs = np.concatenate([
+            ((grid[:, :, 1:] == grid[:, :, :-1]) & (grid[:, :, 1:] != 0)
+                ).reshape(self._count, -1),
+            ((grid[:, 1:, :] == grid[:, :-1, :]) & (grid[:, 1:, :] != 0)
+                ).reshape(self._count, -1)], axis=1)
+        return empty.any(axis=1) & ~empty.all(axis=1) | pairs.any(axis=1)
+
+    def set_tile(self, index, row, col, value):
+        """
+        Set the tile at position row, col of the game at index to have
+        the given value.
+        """
+        self._grid[index, row, col] = value
+
+    def get_tile(self, index, row, col):
+        """
+        Return the value of the tile at position row, col of the game
+        at index.
+        """
+        return int(self._grid[index, row, col])
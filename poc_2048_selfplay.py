@@ -0,0 +1,150 @@
+"""
+Headless self-play runner for 2048.
+"""
+import random
+import time
+from multiprocessing import Pool
+import poc_2048
+
+DIRECTIONS = (poc_2048.UP, poc_2048.DOWN, poc_2048.LEFT, poc_2048.RIGHT)
+
+def policy_random(game):
+    """
+    Pick a random direction.
+    """
+    return random.choice(DIRECTIONS)
+
+def policy_expectimax(game):
+    """
+    Pick the direction chosen by a depth 2 expectimax player,
+    created once per process.
+    """
+    if not _PLAYERS:
+        _PLAYERS.append(poc_2048.ExpectimaxPlayer(depth=2))
+    return _PLAYERS[0].get_move(game)
+
+_PLAYERS = []
+
+def play_game(policy, seed, engine=poc_2048.TwentyFortyEightBitboard,
+              max_moves=None):
+    """
+    Play one 4x4 game with the given policy after seeding random.
+
+    Returns a tuple (max tile, sum of tiles, moves, seconds).
+    """
+    random.seed(seed)
+    start = time.time()
+    game = engine(4, 4)
+    moves = 0
+    while max_moves is None or moves < max_moves:
+        direction = policy(game)
+        if direction is None:
+            break
+        moves += 1
+        if not game.move(direction):
+            break
+    tiles = [game.get_tile(row, col) for row in range(4) for col in range(4)]
+    return max(tiles), sum(tiles), moves, time.time() - start
+
+def _play_game(args):
+    """
+    Unpack the arguments of play_game for Pool.imap_unordered.
+    """
+    return play_game(*args)
+
+class SelfPlayStats:
+    """
+    Aggregated results of many games.
+    """
+    def __init__(self):
+        self._max_tiles = {}
+        self._scores = []
+        self._moves = 0
+        self._start = time.time()
+        self._elapsed = 0.0
+
+    def __str__(self):
+        """
+        Return human readable statistics
+        """
+        return str({ "games": self.get_games(),
+            "max tiles": self.get_max_tile_histogram(),
+            "scores": self.get_score_summary(),
+            "moves per second": self.get_moves_per_second() })
+
+    def add(self, max_tile, score, moves):
+        """
+        Add the result of one game.
+        """
+        self._max_tiles[max_tile] = self._max_tiles.get(max_tile, 0) + 1
+        self._scores.append(score)
+        self._moves += moves
+        self._elapsed = time.time() - self._start
+
+    def get_games(self):
+        """
+        Return the number of games played.
+        """
+        return len(self._scores)
+
+    def get_max_tile_histogram(self):
+        """
+        Return a dictionary mapping max tile to number of games.
+        """
+        return dict(self._max_tiles)
+
+    def get_scores(self):
+        """
+        Return the list of scores in order of arrival.
+        """
+        return list(self._scores)
+
+    def get_score_summary(self):
+        """
+        Return minimum, mean, median and maximum score.
+        """
+        if not self._scores:
+            return None
+        scores = sorted(self._scores)
+        return (scores[0], float(sum(scores)) / len(scores),
+            scores[len(scores) // 2], scores[-1])
+
+    def get_moves_per_second(self):
+        """
+        Return moves played per wall clock second.
+        """
+        return self._moves / self._elapsed if self._elapsed else 0.0
+
+def run_games(policy, num_games, processes=None, seed=0,
+              engine=poc_2048.TwentyFortyEightBitboard, max_moves=None,
+              callback=None):
+    """
+    Play num_games games with the given policy on a process pool,
+    game i being seeded with seed + i so results do not depend on
+    scheduling.  The policy and engine must be picklable, e.g.
+    module level functions and classes.
+
+    Aggregates results as they arrive, calling callback with the
+    statistics after each game, and returns the final SelfPlayStats.
+    """
+    stats = SelfPlayStats()
+    tasks = [(policy, seed + idx, engine, max_moves)
+        for idx in range(num_games)]
+    if processes == 1:
+        results = (_play_game(task) for task in tasks)
+        pool = None
+    else:
+        pool = Pool(processes)
+        results = pool.imap_unordered(_play_game, tasks)
+    try:
+        for max_tile, score, moves, _ in results:
+            stats.add(max_tile, score, moves)
+            if callback is not None:
+                callback(stats)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return stats
+
+if __name__ == "__main__":
+    print(run_games(policy_random, 1000))
@@ -1,14 +1,157 @@
 """
 Cookie Clicker Simulator
 """
-from math import ceil
+from array import array
+from bisect import bisect_left, bisect_right
+from heapq import heapify, heappop, heappush
+from math import ceil, floor, frexp, ldexp, log
 
-import simpleplot
-import codeskulptor
-codeskulptor.set_timeout(20)
 import poc_clicker_provided as provided
 
 SIM_TIME = 10000000000.0
+LOOKAHEAD_DEPTH = 2
+PLOT_RESOLUTION = 1000
+
+class History:
+    """
+    Purchase history stored in parallel array columns of times, item
+    indices, costs and total cookies, with item names interned.
+
+    Entries are only built as tuples when to_list is called, and kept
+    so the next call only builds those appended since.
+    """
+    def __init__(self):
+        self._names = [None]
+        self._name_index = {None: 0}
+        self._times = array('d')
+        self._items = array('i')
+        self._costs = array('d')
+        self._totals = array('d')
+        self._entries = []
+
+    def __len__(self):
+        """
+        Return number of history entries
+        """
+        return len(self._times)
+
+    def __getitem__(self, index):
+        """
+        Return history entry (or list of entries for a slice)
+        """
+        if isinstance(index, slice):
+            return [self[idx] for idx in range(*index.indices(len(self)))]
+        return (self._times[index], self._names[self._items[index]],
+            self._costs[index], self._totals[index])
+
+    def __iter__(self):
+        """
+        Iterate over history entries
+        """
+        names = self._names
+        for time, item, cost, total in zip(self._times, self._items,
+                                           self._costs, self._totals):
+            yield time, names[item], cost, total
+
+    def to_list(self):
+        """
+        Return history as a list of (time, item, cost, total) tuples
+        """
+        start = len(self._entries)
+        if start < len(self._times):
+            self._entries.extend(zip(self._times[start:],
+                map(self._names.__getitem__, self._items[start:]),
+                self._costs[start:], self._totals[start:]))
+        return list(self._entries)
+
+    def append(self, time, item_name, cost, total):
+        """
+        Append history entry
+        """
+        item = self._name_index.get(item_name)
+        if item is None:
+            item = len(self._names)
+            self._names.append(item_name)
+            self._name_index[item_name] = item
+        self._times.append(time)
+        self._items.append(item)
+        self._costs.append(cost)
+        self._totals.append(total)
+
+    def get_columns(self):
+        """
+        Return item names and the arrays of times, item indices, costs
+        and total cookies, the arrays are not copied and must not be
+        modified
+        """
+        return (list(self._names), self._times, self._items, self._costs,
+            self._totals)
+
+    def downsample(self, step=1, resolution=None):
+        """
+        Return (time, total cookies) pairs of every step-th entry, or
+        of at most one entry per resolution seconds if resolution is
+        given.  The last entry is always kept.
+        """
+        times, totals = self._times, self._totals
+        if resolution is None:
+            indices = list(range(0, len(times), step))
+        else:
+            indices, next_time = [], None
+            for idx, time in enumerate(times):
+                if next_time is None or time >= next_time:
+                    indices.append(idx)
+                    next_time = time + resolution
+        if times and indices[-1] != len(times) - 1:
+            indices.append(len(times) - 1)
+        return [(times[idx], totals[idx]) for idx in indices]
+
+class HistoryView:
+    """
+    Read-only view of a history that does not copy it.
+    """
+    def __init__(self, history):
+        self._history = history
+
+    def __len__(self):
+        """
+        Return number of history entries
+        """
+        return len(self._history)
+
+    def __getitem__(self, index):
+        """
+        Return history entry (or list of entries for a slice)
+        """
+        return self._history[index]
+
+    def __iter__(self):
+        """
+        Iterate over history entries
+        """
+        return iter(self._history)
+
+    def last(self):
+        """
+        Return the most recent history entry
+        """
+        return self._history[-1]
+
+    def get_columns(self):
+        """
+        Return item names and the arrays of times, item indices, costs
+        and total cookies, the arrays are not copied and must not be
+        modified
+        """
+        return self._history.get_columns()
+
+    def downsample(self, step=1, resolution=None):
+        """
+        Return (time, total cookies) pairs of every step-th entry, or
+        of at most one entry per resolution seconds if resolution is
+        given.  The last entry is always kept.
+        """
+        return self._history.downsample(step, resolution)
 
 class ClickerState:
     """
@@ -17,7 +160,9 @@ class ClickerState:
     def __init__(self):
         self._cookies = 0.0
         self._cps = 1.0
-        self._history = [(0.0, None, 0.0, 0.0)]
+        self._history = History()
+        self._history.append(0.0, None, 0.0, 0.0)
+        self._history_view = HistoryView(self._history)
         self._time = 0.0
         self._total = 0.0
 
@@ -51,6 +196,13 @@ class ClickerState:
         """
         return self._time
 
+    def get_total(self):
+        """
+        Get total number of cookies produced
+        Should return a float
+        """
+        return self._total
+
     def get_history(self):
         """
         Return history list
@@ -58,7 +210,14 @@ class ClickerState:
         (time, item, cost of item, total cookies)
         For example: (0.0, None, 0.0, 0.0)
         """
-        return list(self._history)
+        return self._history.to_list()
+
+    def get_history_view(self):
+        """
+        Return read-only view of the history list, it reflects
+        later purchases and is not copied
+        """
+        return self._history_view
 
     def time_until(self, cookies):
         """
@@ -90,7 +249,58 @@ class ClickerState:
             return
         self._cookies -= cost
         self._cps += additional_cps
-        self._history.append((self._time, item_name, cost, self._total))
+        self._history.append(self._time, item_name, cost, self._total)
+
+    def buy_bulk(self, item_name, cost, additional_cps, growth, time_left):
+        """
+        Buy the item as many consecutive times as fits in time_left,
+        its cost being multiplied by growth after every purchase.
+        Every purchase that needs waiting takes one step of the loop,
+        as cps grows with each of them; only runs of purchases the
+        cookies already cover are counted at once from the geometric
+        series of their costs.  The saving over buying one at a time
+        is the strategy calls and history entries skipped.
+
+        Appends a single history entry with the time and total cookies
+        of the last purchase and the cost of all of them.
+        Returns the number of items bought and the cost of the next one
+        """
+        cookies, cps = self._cookies, self._cps
+        time, total = self._time, self._total
+        end = time + time_left
+        count, spent = 0, 0.0
+        while True:
+            if cookies >= cost:
+                if growth > 1.0:
+                    burst = int(floor(log(1.0 + cookies * (growth - 1.0) / cost)
+                        / log(growth)))
+                else:
+                    burst = int(cookies // cost)
+                burst = max(burst, 1)
+                burst_cost = cost * burst
+                if growth > 1.0:
+                    burst_cost = cost * (growth ** burst - 1.0) / (growth - 1.0)
+                    while burst > 1 and burst_cost > cookies:
+                        burst -= 1
+                        burst_cost = cost * (growth ** burst - 1.0) / (growth - 1.0)
+                cookies = max(cookies - burst_cost, 0.0)
+                cps += burst * additional_cps
+                count += burst
+                spent += burst_cost
+                cost *= growth ** burst
+                continue
+            wait = ceil((cost - cookies) / cps)
+            if time + wait > end:
+                break
+            cookies += wait * cps
+            total += wait * cps
+            time += wait
+
+        self._cookies, self._cps = cookies, cps
+        self._time, self._total = time, total
+        if count:
+            self._history.append(time, item_name, spent, total)
+        return count, cost
 
 def simulate_clicker(build_info, duration, strategy):
     """
@@ -117,6 +327,44 @@ def simulate_clicker(build_info, duration, strategy):
 
     return state
 
+def simulate_clicker_fast(build_info, duration, strategy, stationary=False):
+    """
+    Function to run a Cookie Clicker game like simulate_clicker, but
+    handing the strategy a read-only view of the history instead of
+    a copy.
+
+    A stationary strategy keeps returning the item it returned last
+    as long as that item can be bought in the time left.  For such
+    strategies consecutive purchases of one item are made without
+    calling the strategy again, in bulk with ClickerState.buy_bulk
+    at the cost growth measured on the first of them.
+    """
+    info = build_info.clone()
+    state = ClickerState()
+    history = state.get_history_view()
+
+    while state.get_time() <= duration:
+        item = strategy(state.get_cookies(), state.get_cps(), history,
+            duration - state.get_time(), info)
+        time_until = state.time_until(info.get_cost(item)) if item else None
+
+        if not item or time_until > duration - state.get_time():
+            break
+
+        state.wait(time_until)
+        cost = info.get_cost(item)
+        state.buy_item(item, cost, info.get_cps(item))
+        info.update_item(item)
+        if stationary:
+            count = state.buy_bulk(item, info.get_cost(item),
+                info.get_cps(item), info.get_cost(item) / cost,
+                duration - state.get_time())[0]
+            for _ in range(count):
+                info.update_item(item)
+    state.wait(duration - state.get_time())
+
+    return state
+
 def strategy_cursor_broken(cookies, cps, history, time_left, build_info):
     """
     Always pick Cursor!
@@ -143,6 +391,9 @@ def strategy_cheap(cookies, cps, history, time_left, build_info):
     """
     Always buy the cheapest item you can afford in the time left.
     """
+    if isinstance(build_info, IndexedBuildInfo):
+        return build_info.cheapest(cookies + cps * time_left)
+
     def cheap(item):
         """
         Function shows how cheap the item is.
@@ -155,12 +406,17 @@ def strategy_expensive(cookies, cps, history, time_left, build_info):
     """
     Always buy the most expensive item you can afford in the time left.
     """
+    if isinstance(build_info, IndexedBuildInfo):
+        return build_info.most_expensive(cookies + cps * time_left)
     return strategy_template(cookies, cps, history, time_left, build_info, build_info.get_cost)
 
 def strategy_best(cookies, cps, history, time_left, build_info):
     """
     The best strategy that you are able to implement.
     """
+    if isinstance(build_info, IndexedBuildInfo):
+        return build_info.most_rentable(cookies + cps * time_left)
+
     def rentability(item):
         """
         Rentability function.
@@ -184,15 +440,293 @@ def strategy_template(cookies, cps, history, time_left, build_info, key):
     except ValueError:
         return None
 
+class IndexedBuildInfo:
+    """
+    Wrapper of a BuildInfo object keeping its items sorted by cost
+    and, in heaps by cps per cost, bucketed by the power of two of
+    their cost, both updated incrementally by update_item.
+    strategy_cheap, strategy_expensive and strategy_best query these
+    indices instead of scanning all items.
+    """
+    def __init__(self, build_info):
+        self._info = build_info
+        by_cost = sorted((build_info.get_cost(item), item)
+            for item in build_info.build_items())
+        self._costs = [cost for cost, _ in by_cost]
+        self._items = [item for _, item in by_cost]
+        self._index_rentability()
+
+    def _index_rentability(self):
+        """
+        Rebuild the rentability heaps from the current costs,
+        dropping the entries left behind by update_item.
+        """
+        self._buckets = {}
+        for cost, item in zip(self._costs, self._items):
+            self._buckets.setdefault(frexp(cost)[1], []).append(
+                (-self._info.get_cps(item) / cost, cost, item))
+        for heap in self._buckets.values():
+            heapify(heap)
+        self._bucket_keys = sorted(self._buckets)
+        self._bucket_list = [(ldexp(1.0, bucket), self._buckets[bucket])
+            for bucket in self._bucket_keys]
+        self._entries = len(self._costs)
+
+    def _clean_top(self, heap):
+        """
+        Drop entries left behind by update_item from the top of heap.
+        """
+        while heap and heap[0][1] != self._info.get_cost(heap[0][2]):
+            heappop(heap)
+            self._entries -= 1
+
+    def build_items(self):
+        """
+        Get a list of buildable items
+        """
+        return self._info.build_items()
+
+    def get_cost(self, item):
+        """
+        Get the current cost of an item
+        """
+        return self._info.get_cost(item)
+
+    def get_cps(self, item):
+        """
+        Get the current CPS of an item
+        """
+        return self._info.get_cps(item)
+
+    def update_item(self, item):
+        """
+        Update the cost of an item by the growth factor
+        and reindex it
+        """
+        old_cost = self._info.get_cost(item)
+        idx = bisect_left(self._costs, old_cost)
+        while self._items[idx] != item:
+            idx += 1
+        del self._costs[idx]
+        del self._items[idx]
+
+        self._info.update_item(item)
+        cost = self._info.get_cost(item)
+        idx = bisect_right(self._costs, cost)
+        self._costs.insert(idx, cost)
+        self._items.insert(idx, item)
+
+        if self._entries >= 2 * len(self._costs):
+            self._index_rentability()
+            return
+        heap = self._buckets[frexp(old_cost)[1]]
+        if heap[0][2] == item:
+            self._clean_top(heap)
+        bucket = frexp(cost)[1]
+        if bucket not in self._buckets:
+            self._buckets[bucket] = []
+            idx = bisect_left(self._bucket_keys, bucket)
+            self._bucket_keys.insert(idx, bucket)
+            self._bucket_list.insert(idx, (ldexp(1.0, bucket),
+                self._buckets[bucket]))
+        heappush(self._buckets[bucket], (-self._info.get_cps(item) / cost,
+            cost, item))
+        self._entries += 1
+
+    def clone(self):
+        """
+        Return a clone of this indexed BuildInfo
+        """
+        return IndexedBuildInfo(self._info.clone())
+
+    def cheapest(self, budget):
+        """
+        Return the cheapest item if it costs at most budget, else None
+        """
+        if not self._costs or self._costs[0] > budget:
+            return None
+        return self._items[0]
+
+    def most_expensive(self, budget):
+        """
+        Return the most expensive item costing at most budget, or None
+        """
+        idx = bisect_right(self._costs, budget)
+        return self._items[idx - 1] if idx else None
+
+    def most_rentable(self, budget):
+        """
+        Return the item with the highest cps per cost among those
+        costing at most budget, or None
+
+        update_item keeps the top entry of every bucket current, so
+        buckets entirely within budget only have their top entry read.
+        Only the bucket holding budget is searched past entries above
+        it, which are put back afterwards, dropping the entries left
+        behind by update_item on the way.
+        """
+        best = None
+        for upper, heap in self._bucket_list:
+            if not heap:
+                continue
+            if upper <= budget:
+                if best is None or heap[0] < best:
+                    best = heap[0]
+                continue
+            if upper > 2.0 * budget:
+                break
+            skipped = []
+            while heap:
+                entry = heap[0]
+                if entry[1] != self._info.get_cost(entry[2]):
+                    heappop(heap)
+                    self._entries -= 1
+                elif entry[1] > budget:
+                    skipped.append(heappop(heap))
+                else:
+                    if best is None or entry < best:
+                        best = entry
+                    break
+            for entry in skipped:
+                heappush(heap, entry)
+            break
+        return None if best is None else best[2]
+
+def strategy_lookahead(cookies, cps, history, time_left, build_info):
+    """
+    Buy the first item of the sequence of LOOKAHEAD_DEPTH purchases
+    with the lowest sum of waiting and payback (cost / added cps)
+    times.
+    """
+    items = build_info.build_items()
+    costs = [build_info.get_cost(item) for item in items]
+    gains = [build_info.get_cps(item) for item in items]
+    search = _PaybackSearch(costs, gains,
+        _cost_growth(build_info, items[0]) if items else 1.0)
+    return search.best_item(cookies, cps, cookies + cps * time_left,
+        LOOKAHEAD_DEPTH, items)
+
+def _cost_growth(build_info, item):
+    """
+    Return the factor update_item multiplies costs by, measured on a
+    clone of build_info once for every build_info object.
+    """
+    if _COST_GROWTH[0] is not build_info:
+        probe = build_info.clone()
+        probe.update_item(item)
+        _COST_GROWTH[:] = [build_info,
+            probe.get_cost(item) / build_info.get_cost(item)]
+    return _COST_GROWTH[1]
+
+_COST_GROWTH = [None, 1.0]
+
+def _undominated(costs, gains):
+    """
+    Return indices of items with positive cps that no other item
+    beats on both cost and cps, cheapest first.
+    """
+    result, max_gain = [], 0.0
+    for idx in sorted(range(len(costs)), key=lambda idx: costs[idx]):
+        if gains[idx] > max_gain:
+            result.append(idx)
+            max_gain = gains[idx]
+    return result
+
+class _PaybackSearch:
+    """
+    Search of the purchase sequences of one decision.
+
+    Items are pruned and sorted once: only items no other item beats
+    on both cost and cps are tried, by increasing payback time at their
+    current cost, and a search stops at the first item whose payback
+    time, plus that of the fastest item for every later purchase, cannot
+    beat the best sequence.  Items bought earlier in a sequence have
+    their cost raised in place for the rest of it.  Sequences are
+    memoized on the items bought before them, which fix cps and costs,
+    the cookies left in seconds of production and the depth.
+    """
+    def __init__(self, costs, gains, growth):
+        self._costs = costs
+        self._gains = gains
+        self._growth = growth
+        self._candidates = sorted((costs[idx] / gains[idx], idx)
+            for idx in _undominated(costs, gains))
+        self._bought = []
+        self._memo = {}
+
+    def best_item(self, cookies, cps, budget, depth, items):
+        """
+        Return the item of items, costing at most budget, starting the
+        sequence of depth purchases with the lowest time, or None.
+        """
+        best_time, best_item = None, None
+        for payback, idx in self._candidates:
+            if best_time is not None and \
+                    self._lower_bound(payback, depth) >= best_time:
+                break
+            if self._costs[idx] > budget:
+                continue
+            total = self.sequence_time(cookies, cps, idx, depth, best_time)
+            if best_time is None or total < best_time:
+                best_time, best_item = total, items[idx]
+        return best_item
+
+    def sequence_time(self, cookies, cps, idx, depth, bound=None):
+        """
+        Return the waiting plus payback time of buying item idx followed
+        by the best depth - 1 purchases, or a value of at least bound if
+        it cannot beat bound.
+        """
+        cost = self._costs[idx]
+        wait = 0.0 if cookies >= cost else ceil((cost - cookies) / cps)
+        payback = wait + cost / self._gains[idx]
+        if depth == 1 or (bound is not None and payback >= bound):
+            return payback
+        self._costs[idx] = cost * self._growth
+        self._bought.append(idx)
+        rest = self.best_time(cookies + wait * cps - cost,
+            cps + self._gains[idx], depth - 1,
+            None if bound is None else bound - payback)
+        self._bought.pop()
+        self._costs[idx] = cost
+        return payback + rest
+
+    def best_time(self, cookies, cps, depth, bound=None):
+        """
+        Return the lowest waiting plus payback time over sequences of
+        depth purchases, or a value of at least bound if none beats it.
+        """
+        key = (tuple(sorted(self._bought)), int(cookies // cps), depth)
+        if key in self._memo:
+            return self._memo[key]
+        best = bound
+        for payback, idx in self._candidates:
+            if best is not None and self._lower_bound(payback, depth) >= best:
+                break
+            total = self.sequence_time(cookies, cps, idx, depth, best)
+            if best is None or total < best:
+                best = total
+        if bound is None or best < bound:
+            self._memo[key] = best
+        return best
+
+    def _lower_bound(self, payback, depth):
+        """
+        Return a lower bound on the time of depth purchases starting
+        with an item of the given payback time at its current cost.
+        """
+        return payback + (depth - 1) * self._candidates[0][0]
+
 def run_strategy(strategy_name, time, strategy):
     """
     Run a simulation with one strategy
     """
+    import simpleplot
     state = simulate_clicker(provided.BuildInfo(), time, strategy)
     print strategy_name, ":", state
 
-    history = state.get_history()
-    history = [(item[0], item[3]) for item in history]
+    history = state.get_history_view().downsample(
+        resolution=time / PLOT_RESOLUTION)
     simpleplot.plot_lines(strategy_name, 1000, 400, 'Time', 'Total Cookies',
         [history], True)
 
@@ -200,9 +734,12 @@ def run():
     """
     Run the simulator.
     """
+    import codeskulptor
+    codeskulptor.set_timeout(20)
     run_strategy("Cursor", SIM_TIME, strategy_cursor_broken)
     run_strategy("Cheap", SIM_TIME, strategy_cheap)
     run_strategy("Expensive", SIM_TIME, strategy_expensive)
     run_strategy("Best", SIM_TIME, strategy_best)
 
-run()
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,154 @@
+"""
+Cookie Clicker strategy tournament
+"""
+import random
+import struct
+import time
+from array import array
+from multiprocessing import Pool
+
+import poc_clicker
+import poc_clicker_provided as provided
+
+STRATEGIES = {
+    "Cursor": poc_clicker.strategy_cursor_broken,
+    "Cheap": poc_clicker.strategy_cheap,
+    "Expensive": poc_clicker.strategy_expensive,
+    "Best": poc_clicker.strategy_best,
+    "Lookahead": poc_clicker.strategy_lookahead,
+}
+
+def random_build_info(count, seed=0):
+    """
+    Return a BuildInfo of count items, their costs spread evenly in
+    magnitude from 10 to 1e10 and their cps from 1e-4 to 10**-2.5 of
+    their cost, drawn with the given seed.
+    """
+    rng = random.Random(seed)
+    info = {}
+    for idx in range(count):
+        cost = 10 ** rng.uniform(1, 10)
+        info["Item %d" % idx] = [cost, cost * 10 ** rng.uniform(-4, -2.5)]
+    return provided.BuildInfo(info)
+
+def play(strategy_name, strategy, build_name, build_info, duration,
+         keep_history=False):
+    """
+    Run one simulation and time it.
+
+    Returns a tuple (strategy name, build name, duration, total cookies,
+    cps, number of purchases, seconds, history view or None).
+    """
+    start = time.time()
+    state = poc_clicker.simulate_clicker_fast(build_info, duration, strategy)
+    seconds = time.time() - start
+    history = state.get_history_view()
+    return (strategy_name, build_name, duration, state.get_total(),
+        state.get_cps(), len(history) - 1, seconds,
+        history if keep_history else None)
+
+def _play(args):
+    """
+    Unpack the arguments of play for Pool.map.
+    """
+    return play(*args)
+
+def run_tournament(strategies, durations=(poc_clicker.SIM_TIME,),
+                   build_infos=None, processes=None, history_file=None):
+    """
+    Run every strategy for every duration and build configuration on
+    a process pool.
+
+    strategies maps names to strategy functions and build_infos maps
+    names to BuildInfo objects (the provided one by default), both
+    must be picklable.  If history_file is given the histories are
+    written to it with write_histories.
+
+    Returns the list of rows (strategy name, build name, duration,
+    total cookies, cps, number of purchases, seconds) and a dictionary
+    mapping strategy names to their total seconds.
+    """
+    if build_infos is None:
+        build_infos = {"Default": provided.BuildInfo()}
+    tasks = [(strategy_name, strategies[strategy_name], build_name,
+        build_infos[build_name], duration, history_file is not None)
+        for strategy_name in sorted(strategies)
+        for build_name in sorted(build_infos)
+        for duration in durations]
+    if processes == 1:
+        results = [_play(task) for task in tasks]
+    else:
+        pool = Pool(processes)
+        try:
+            results = pool.map(_play, tasks)
+        finally:
+            pool.terminate()
+
+    if history_file is not None:
+        write_histories(history_file, [("%s/%s/%r" % result[:3], result[-1])
+            for result in results])
+    rows = [result[:-1] for result in results]
+    costs = dict((strategy_name, 0.0) for strategy_name in strategies)
+    for row in rows:
+        costs[row[0]] += row[6]
+    return rows, costs
+
+def format_table(rows, costs):
+    """
+    Return the tournament results as a human readable table.
+    """
+    lines = ["%-12s %-10s %10s %12s %12s %10s %9s" % ("Strategy", "Build",
+        "Duration", "Total", "CPS", "Purchases", "Seconds")]
+    for row in rows:
+        lines.append("%-12s %-10s %10.3g %12.6g %12.6g %10d %9.3f" % row)
+    for strategy_name in sorted(costs):
+        lines.append("%-12s %-10s %10s %12s %12s %10s %9.3f" % (strategy_name,
+            "all", "", "", "", "", costs[strategy_name]))
+    return "\n".join(lines)
+
+def write_histories(filename, histories):
+    """
+    Write histories to a binary columnar file.
+
+    histories is a list of (name, history) pairs, the histories being
+    History objects or views of them.  Every history is stored as its
+    name, its item names and its four columns: times, item indices,
+    costs and total cookies.
+    """
+    with open(filename, "wb") as out:
+        out.write(struct.pack("<I", len(histories)))
+        for name, history in histories:
+            columns = history.get_columns()
+            header = "\n".join([name] + columns[0][1:]).encode("utf-8")
+            out.write(struct.pack("<II", len(header), len(history)))
+            out.write(header)
+            for column in columns[1:]:
+                column.tofile(out)
+
+def read_histories(filename):
+    """
+    Read histories written by write_histories.
+
+    Returns a list of (name, History) pairs.
+    """
+    histories = []
+    with open(filename, "rb") as source:
+        count = struct.unpack("<I", source.read(4))[0]
+        for _ in range(count):
+            header_size, size = struct.unpack("<II", source.read(8))
+            header = source.read(header_size).decode("utf-8").split("\n")
+            items = [None] + header[1:]
+            columns = []
+            for typecode in "didd":
+                column = array(typecode)
+                column.fromfile(source, size)
+                columns.append(column)
+            history = poc_clicker.History()
+            for entry_time, item, cost, total in zip(*columns):
+                history.append(entry_time, items[item], cost, total)
+            histories.append((header[0], history))
+    return histories
+
+if __name__ == "__main__":
+    print(format_table(*run_tournament(STRATEGIES, build_infos={
+        "Default": provided.BuildInfo(), "Random200": random_build_info(200)})))
@@ -2,23 +2,156 @@
 Monte Carlo Tic-Tac-Toe Player
 """
 import random
-import poc_ttt_gui
+import time
+from math import sqrt
 import poc_ttt_provided as provided
 
 NTRIALS = 512
 SCORE_CURRENT = 1.0
 SCORE_OTHER = 1.0
+TIME_LIMIT = 0.5
+MIN_TRIALS = 32
+CONFIDENCE = 3.0
+
+class RolloutBoard:
+    """
+    Copy of a Tic-Tac-Toe board for playing games out quickly.
+
+    Counts the squares of each player in every row, column and diagonal,
+    so that move detects a win from the last move alone and check_win
+    answers without scanning the board.  Supports the methods of the
+    provided board used by the players.  If reverse is not given it is
+    found with is_reversed.
+    """
+    def __init__(self, board, reverse=None):
+        if isinstance(board, RolloutBoard):
+            self._dim, self._reverse = board._dim, board._reverse
+            self._grid = list(board._grid)
+            self._counts = dict((player, list(counts))
+                for player, counts in board._counts.items())
+            self._empty, self._winner = board._empty, board._winner
+            return
+
+        dim = board.get_dim()
+        self._dim = dim
+        self._reverse = is_reversed(board) if reverse is None else reverse
+        self._grid = [provided.EMPTY] * (dim * dim)
+        self._counts = {provided.PLAYERX: [0] * (2 * dim + 2),
+                        provided.PLAYERO: [0] * (2 * dim + 2)}
+        self._empty, self._winner = dim * dim, None
+        for row in range(dim):
+            for col in range(dim):
+                if board.square(row, col) != provided.EMPTY:
+                    self.move(row, col, board.square(row, col))
+
+    def __str__(self):
+        """
+        Human readable representation of the board.
+        """
+        marks = {provided.EMPTY: " ", provided.PLAYERX: "X",
+                 provided.PLAYERO: "O"}
+        return "\n".join("".join(marks[square] for square in
+            self._grid[row * self._dim:(row + 1) * self._dim])
+            for row in range(self._dim))
+
+    def get_dim(self):
+        """
+        Return the dimension of the board.
+        """
+        return self._dim
+
+    def square(self, row, col):
+        """
+        Return the status of the square at (row, col).
+        """
+        return self._grid[row * self._dim + col]
+
+    def get_empty_squares(self):
+        """
+        Return a list of (row, col) tuples of the empty squares.
+        """
+        return [divmod(square, self._dim) for square, status
+            in enumerate(self._grid) if status == provided.EMPTY]
+
+    def move(self, row, col, player):
+        """
+        Place player on the board at (row, col) if it is empty.
+        """
+        dim = self._dim
+        if self._grid[row * dim + col] != provided.EMPTY:
+            return
+        self._grid[row * dim + col] = player
+        self._empty -= 1
+        counts = self._counts[player]
+        lines = [row, dim + col]
+        if row == col:
+            lines.append(2 * dim)
+        if row + col == dim - 1:
+            lines.append(2 * dim + 1)
+        for line in lines:
+            counts[line] += 1
+            if counts[line] == dim and self._winner is None:
+                self._winner = player
+                if self._reverse:
+                    self._winner = provided.switch_player(player)
+
+    def check_win(self):
+        """
+        Return the winner, DRAW if the board is full and nobody won,
+        or None if the game is not over.
+        """
+        if self._winner is None and not self._empty:
+            return provided.DRAW
+        return self._winner
+
+    def clone(self):
+        """
+        Return a copy of the board.
+        """
+        return RolloutBoard(self)
+
+def is_reversed(board, default=False):
+    """
+    This function takes a board and checks whether it is played in
+    reverse mode: on a won board by comparing the winner with the owner
+    of the completed line, otherwise by completing a line for one player
+    on a copy of it.  Returns default if the mode cannot be told, on a
+    drawn board or one where no line can be completed anymore
+    """
+    win = board.check_win()
+    if win == provided.DRAW:
+        return default
+    if win is not None:
+        dim = board.get_dim()
+        lines = [[(row, col) for col in range(dim)] for row in range(dim)]
+        lines.extend([[(row, col) for row in range(dim)] for col in range(dim)])
+        lines.append([(idx, idx) for idx in range(dim)])
+        lines.append([(idx, dim - 1 - idx) for idx in range(dim)])
+        for line in lines:
+            owners = set(board.square(row, col) for row, col in line)
+            if len(owners) == 1 and provided.EMPTY not in owners:
+                return win != owners.pop()
+        return default
+    for player in (provided.PLAYERX, provided.PLAYERO):
+        clone = board.clone()
+        for row, col in clone.get_empty_squares():
+            clone.move(row, col, player)
+        win = clone.check_win()
+        if win != provided.DRAW:
+            return win != player
+    return default
 
 def mc_trial(board, player):
     """
     This function takes a current board and the next player to move
     """
     empty_squares = board.get_empty_squares()
-    while not board.check_win():
-        row, col = random.sample(empty_squares, 1)[0]
+    random.shuffle(empty_squares)
+    for row, col in empty_squares:
+        if board.check_win():
+            break
         board.move(row, col, player)
         player = provided.switch_player(player)
-        empty_squares.remove((row, col))
 
 def mc_update_scores(scores, board, player):
     """
@@ -73,11 +206,57 @@ def mc_move(board, player, trials):
     """
     dim = board.get_dim()
     scores = [[0] * dim for _ in range(dim)]
+    rollout = RolloutBoard(board)
     for _ in range(trials):
-        clone = board.clone()
+        clone = rollout.clone()
         mc_trial(clone, player)
         mc_update_scores(scores, clone, player)
     return get_best_move(board, scores)
 
+def mc_move_timed(board, player, time_limit):
+    """
+    This function takes a current board, which player the machine player is, and
+    the number of seconds to spend; it runs trials until the time is up or,
+    after MIN_TRIALS trials, the best square's mean score leads every other
+    by more than CONFIDENCE standard errors
+    """
+    dim = board.get_dim()
+    empty_squares = board.get_empty_squares()
+    scores = [[0] * dim for _ in range(dim)]
+    squares = [[0] * dim for _ in range(dim)]
+    rollout = RolloutBoard(board)
+    deadline = time.time() + time_limit
+    trials = 0
+    while len(empty_squares) > 1 and time.time() < deadline:
+        clone = rollout.clone()
+        mc_trial(clone, player)
+        trial_scores = [[0] * dim for _ in range(dim)]
+        mc_update_scores(trial_scores, clone, player)
+        for row, col in empty_squares:
+            scores[row][col] += trial_scores[row][col]
+            squares[row][col] += trial_scores[row][col] ** 2
+        trials += 1
+        if trials >= MIN_TRIALS and is_decided(empty_squares, scores,
+                                               squares, trials):
+            break
+    return get_best_move(board, scores)
+
+def is_decided(empty_squares, scores, squares, trials):
+    """
+    This function takes the empty squares, the grids of summed scores and
+    summed squared scores and the number of trials, and checks whether the
+    confidence interval of the best square lies above those of all others
+    """
+    bounds = []
+    for row, col in empty_squares:
+        mean = float(scores[row][col]) / trials
+        variance = max(float(squares[row][col]) / trials - mean * mean, 0.0)
+        error = CONFIDENCE * sqrt(variance / trials)
+        bounds.append((mean, mean - error, mean + error))
+    bounds.sort(reverse=True)
+    return all(bounds[0][1] > upper for _, _, upper in bounds[1:])
+
 # provided.play_game(mc_move, NTRIALS, False)
+# provided.play_game(mc_move_timed, TIME_LIMIT, False)
+# import poc_ttt_gui
 # poc_ttt_gui.run_gui(3, provided.PLAYERX, mc_move, NTRIALS, False)
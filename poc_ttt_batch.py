@@ -0,0 +1,83 @@
+"""
+Monte Carlo Tic-Tac-Toe Player playing all trials of a move at once
+with NumPy
+"""
+import numpy as np
+import poc_ttt_provided as provided
+from poc_ttt import SCORE_CURRENT, SCORE_OTHER, get_best_move, is_reversed
+
+_RNG = np.random.default_rng()
+
+def board_lines(dim):
+    """
+    Return the array of flat square indices of every row, column and
+    diagonal of a dim x dim board, one line per row of the array.
+    """
+    squares = np.arange(dim * dim).reshape(dim, dim)
+    return np.concatenate([squares, squares.T, [squares.diagonal()],
+        [squares[:, ::-1].diagonal()]])
+
+def mc_trials(board, player, trials, rng=_RNG, reverse=None):
+    """
+    Play trials random games from the current board, the given player
+    moving first, in reverse mode if reverse is set or, if it is not
+    given, if is_reversed finds the board played in it.
+
+    Returns the final boards as an array of shape (trials, dim * dim)
+    and the winner of every game.
+    """
+    if reverse is None:
+        reverse = is_reversed(board)
+    dim = board.get_dim()
+    grid = np.array([board.square(row, col) for row in range(dim)
+        for col in range(dim)])
+    empty = np.flatnonzero(grid == provided.EMPTY)
+    other = provided.switch_player(player)
+
+    # Fill the empty squares in a random order per trial, recording
+    # the move number at which every square is filled.
+    order = np.argsort(rng.random((trials, empty.size)), axis=1)
+    moves = np.full((trials, dim * dim), -1)
+    moves[np.arange(trials)[:, None], empty[order]] = np.arange(empty.size)
+    boards = np.tile(grid, (trials, 1))
+    boards[:, empty] = np.where(moves[:, empty] % 2 == 0, player, other)
+
+    # A line is won at the move filling its last square if all its
+    # squares belong to one player, the game ends at the first such move.
+    lines = board_lines(dim)
+    line_squares = boards[:, lines]
+    won = (line_squares == line_squares[:, :, :1]).all(axis=2) & \
+        (line_squares[:, :, 0] != provided.EMPTY)
+    won_at = np.where(won, moves[:, lines].max(axis=2), empty.size)
+    first = won_at.argmin(axis=1)
+    end = won_at[np.arange(trials), first]
+
+    owners = line_squares[np.arange(trials), first, 0]
+    if reverse:
+        owners = np.where(owners == player, other, player)
+    winners = np.where(end < empty.size, owners, provided.DRAW)
+    boards[moves > end[:, None]] = provided.EMPTY
+    return boards, winners
+
+def mc_update_scores(scores, boards, winners, player):
+    """
+    Add the scores of all completed games to the flat array of scores.
+    """
+    decided = (winners != provided.DRAW)[:, None]
+    mine = boards == player
+    weight = np.where(mine, SCORE_CURRENT, SCORE_OTHER) * \
+        (boards != provided.EMPTY) * decided
+    sign = np.where(mine == (winners == player)[:, None], 1.0, -1.0)
+    scores += (weight * sign).sum(axis=0)
+
+def mc_move(board, player, trials, rng=_RNG):
+    """
+    This function takes a current board, which player the machine player is, and
+    the number of trials to run
+    """
+    dim = board.get_dim()
+    scores = np.zeros(dim * dim)
+    if trials > 0:
+        boards, winners = mc_trials(board, player, trials, rng)
+        mc_update_scores(scores, boards, winners, player)
+    return get_best_move(board, scores.reshape(dim, dim).tolist())
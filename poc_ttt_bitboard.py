@@ -0,0 +1,256 @@
+"""
+Tic-Tac-Toe players on a bitmask board
+"""
+import random
+import poc_ttt_provided as provided
+from poc_ttt import SCORE_CURRENT, SCORE_OTHER, get_best_move, is_reversed
+from poc_tttmm import SCORES
+
+_WIN_MASKS = {}
+
+def win_masks(dim):
+    """
+    Return the masks of the rows, columns and diagonals of a dim x dim
+    board, square (row, col) being bit row * dim + col, and for every
+    square the list of masks of the lines through it.
+    """
+    if dim not in _WIN_MASKS:
+        lines = [[(row, col) for col in range(dim)] for row in range(dim)]
+        lines.extend([[(row, col) for row in range(dim)] for col in range(dim)])
+        lines.append([(idx, idx) for idx in range(dim)])
+        lines.append([(idx, dim - 1 - idx) for idx in range(dim)])
+        masks = [sum(1 << (row * dim + col) for row, col in line)
+            for line in lines]
+        square_masks = [[mask for mask in masks if mask >> square & 1]
+            for square in range(dim * dim)]
+        _WIN_MASKS[dim] = (masks, square_masks)
+    return _WIN_MASKS[dim]
+
+def squares_of(mask, dim):
+    """
+    Return the (row, col) tuples of the bits set in mask.
+    """
+    squares = []
+    while mask:
+        low = mask & -mask
+        squares.append(divmod(low.bit_length() - 1, dim))
+        mask ^= low
+    return squares
+
+class BitBoard:
+    """
+    Tic-Tac-Toe board held as one bitmask per player.
+
+    Supports the methods of the provided board, and unmove, or snapshot
+    and restore, to take back moves instead of cloning before them.
+    The winner is found from the lines through the last move; moves are
+    not expected after a win.
+    """
+    def __init__(self, dim, reverse=False):
+        self._dim = dim
+        self._reverse = reverse
+        self._full = (1 << (dim * dim)) - 1
+        self._square_masks = win_masks(dim)[1]
+        self._masks = {provided.PLAYERX: 0, provided.PLAYERO: 0}
+        self._occupied = 0
+        self._winner = None
+
+    def __str__(self):
+        """
+        Human readable representation of the board.
+        """
+        marks = {provided.EMPTY: " ", provided.PLAYERX: "X",
+                 provided.PLAYERO: "O"}
+        return "\n".join("".join(marks[self.square(row, col)]
+            for col in range(self._dim)) for row in range(self._dim))
+
+    def get_dim(self):
+        """
+        Return the dimension of the board.
+        """
+        return self._dim
+
+    def get_masks(self, player):
+        """
+        Return the masks of player's squares and of the other player's.
+        """
+        return self._masks[player], self._masks[provided.switch_player(player)]
+
+    def square(self, row, col):
+        """
+        Return the status of the square at (row, col).
+        """
+        bit = 1 << (row * self._dim + col)
+        if self._masks[provided.PLAYERX] & bit:
+            return provided.PLAYERX
+        if self._masks[provided.PLAYERO] & bit:
+            return provided.PLAYERO
+        return provided.EMPTY
+
+    def get_empty_squares(self):
+        """
+        Return a list of (row, col) tuples of the empty squares.
+        """
+        return squares_of(self._full & ~self._occupied, self._dim)
+
+    def move(self, row, col, player):
+        """
+        Place player on the board at (row, col) if it is empty.
+        """
+        square = row * self._dim + col
+        bit = 1 << square
+        if self._occupied & bit:
+            return
+        self._occupied |= bit
+        mask = self._masks[player] | bit
+        self._masks[player] = mask
+        for line in self._square_masks[square]:
+            if mask & line == line:
+                self._winner = player
+                if self._reverse:
+                    self._winner = provided.switch_player(player)
+                break
+
+    def unmove(self, row, col):
+        """
+        Empty the square at (row, col), taking back the last move.
+        """
+        bit = ~(1 << (row * self._dim + col))
+        self._masks[provided.PLAYERX] &= bit
+        self._masks[provided.PLAYERO] &= bit
+        self._occupied &= bit
+        self._winner = None
+
+    def snapshot(self):
+        """
+        Return the state of the board for restore.
+        """
+        return (self._masks[provided.PLAYERX], self._masks[provided.PLAYERO],
+            self._winner)
+
+    def restore(self, state):
+        """
+        Return the board to a state returned by snapshot.
+        """
+        self._masks[provided.PLAYERX], self._masks[provided.PLAYERO], \
+            self._winner = state
+        self._occupied = state[0] | state[1]
+
+    def check_win(self):
+        """
+        Return the winner, DRAW if the board is full and nobody won,
+        or None if the game is not over.
+        """
+        if self._winner is None and self._occupied == self._full:
+            return provided.DRAW
+        return self._winner
+
+    def clone(self):
+        """
+        Return a copy of the board.
+        """
+        board = BitBoard(self._dim, self._reverse)
+        board._masks = dict(self._masks)
+        board._occupied = self._occupied
+        board._winner = self._winner
+        return board
+
+def to_bitboard(board, reverse=None):
+    """
+    Return a BitBoard with the squares of board, found to be played in
+    reverse mode with is_reversed unless reverse is given.  Callers that
+    know the mode should give it, as is_reversed cannot tell it on
+    boards where no line can be completed anymore.
+    """
+    dim = board.get_dim()
+    if reverse is None:
+        reverse = is_reversed(board)
+    bitboard = BitBoard(dim, reverse)
+    for row in range(dim):
+        for col in range(dim):
+            if board.square(row, col) != provided.EMPTY:
+                bitboard.move(row, col, board.square(row, col))
+    return bitboard
+
+def mc_trial(board, player):
+    """
+    This function takes a current board and the next player to move,
+    plays a random game on it and returns the list of squares played
+    """
+    played = []
+    empty_squares = board.get_empty_squares()
+    random.shuffle(empty_squares)
+    for row, col in empty_squares:
+        if board.check_win():
+            break
+        board.move(row, col, player)
+        player = provided.switch_player(player)
+        played.append((row, col))
+    return played
+
+def mc_update_scores(scores, board, player):
+    """
+    This function takes a grid of scores (a list of lists) with the same
+    dimensions as the Tic-Tac-Toe board, a board from a completed game, and
+    which player the machine player is
+    """
+    win = board.check_win()
+    if win == provided.DRAW:
+        return
+    sign = 1 if win == player else -1
+    mine, theirs = board.get_masks(player)
+    for row, col in squares_of(mine, board.get_dim()):
+        scores[row][col] += sign * SCORE_CURRENT
+    for row, col in squares_of(theirs, board.get_dim()):
+        scores[row][col] -= sign * SCORE_OTHER
+
+def mc_move(board, player, trials):
+    """
+    This function takes a current board, which player the machine player is, and
+    the number of trials to run
+    """
+    dim = board.get_dim()
+    scores = [[0] * dim for _ in range(dim)]
+    bitboard = to_bitboard(board)
+    start = bitboard.snapshot()
+    for _ in range(trials):
+        mc_trial(bitboard, player)
+        mc_update_scores(scores, bitboard, player)
+        bitboard.restore(start)
+    return get_best_move(bitboard, scores)
+
+def mm_move(board, player):
+    """
+    Make a move on the board.
+
+    Returns a tuple with two elements.  The first element is the score
+    of the given board and the second element is the desired move as a
+    tuple, (row, col).
+    """
+    win = board.check_win()
+    if win:
+        return SCORES[win], (-1, -1)
+    if not isinstance(board, BitBoard):
+        board = to_bitboard(board)
+
+    max_score, max_move = -2, (-1, -1)
+    for row, col in board.get_empty_squares():
+        board.move(row, col, player)
+        score = mm_move(board, provided.switch_player(player))[0]
+        board.unmove(row, col)
+        score *= SCORES[player]
+        if score > max_score:
+            max_score, max_move = score, (row, col)
+    return max_score * SCORES[player], max_move
+
+def move_wrapper(board, player, trials):
+    """
+    Wrapper to allow the use of the same infrastructure that was used
+    for Monte Carlo Tic-Tac-Toe.
+    """
+    move = mm_move(board, player)
+    assert move[1] != (-1, -1), "returned illegal move (-1, -1)"
+    return move[1]
+
+# provided.play_game(mc_move, 512, False)
+# provided.play_game(move_wrapper, 1, False)
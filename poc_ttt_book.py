@@ -0,0 +1,191 @@
+"""
+Tic-Tac-Toe opening book
+"""
+import mmap
+import os
+import struct
+import poc_ttt_provided as provided
+from poc_ttt import RolloutBoard, is_reversed
+from poc_tttmm import SCORES, AlphaBeta, board_symmetries, move_wrapper
+
+MAGIC = b"TTTB"
+HEADER = struct.Struct("<4sBBBI")
+# Depth stored in the header of books of every reachable position.
+FULL_DEPTH = 255
+RECORD = struct.Struct("<QbB")
+DIGITS = {provided.EMPTY: 0, provided.PLAYERX: 1, provided.PLAYERO: 2}
+
+def position_key(grid, player, symmetries):
+    """
+    Return the book key of the flat grid with player to move and the
+    index of the symmetry giving it.
+
+    The key encodes the smallest symmetric copy of the grid as a base 3
+    number, doubled, plus one if PLAYERO is to move.
+    """
+    best, best_sym = None, None
+    for sym, perm in enumerate(symmetries):
+        code = 0
+        for square in perm:
+            code = code * 3 + DIGITS[grid[square]]
+        if best is None or code < best:
+            best, best_sym = code, sym
+    return best * 2 + (player != provided.PLAYERX), best_sym
+
+def build_book(dim=3, depth=None, reverse=False):
+    """
+    Solve every position reachable with at most depth moves played,
+    all of them if depth is None, PLAYERX moving first.
+
+    Returns a dictionary mapping position keys to (score for the player
+    to move, best square of the symmetric copy giving the key).
+    """
+    search = AlphaBeta(dim, reverse)
+    symmetries = board_symmetries(dim)
+    book = {}
+    start = RolloutBoard(provided.TTTBoard(dim, reverse), reverse)
+    stack = [(start, provided.PLAYERX, 0)]
+    while stack:
+        board, player, plies = stack.pop()
+        grid = [board.square(row, col) for row in range(dim)
+            for col in range(dim)]
+        key, sym = position_key(grid, player, symmetries)
+        if key in book:
+            continue
+        score, square = search.search(grid, player)
+        book[key] = (score, symmetries[sym].index(square))
+        if depth is not None and plies >= depth:
+            continue
+        for row, col in board.get_empty_squares():
+            child = board.clone()
+            child.move(row, col, player)
+            if child.check_win() is None:
+                stack.append((child, provided.switch_player(player), plies + 1))
+    return book
+
+def write_book(filename, book, dim, depth=None, reverse=False):
+    """
+    Write a book made by build_book to a binary file: a header with the
+    dimension, the depth, the mode and the number of positions, then one
+    record per position sorted by key.
+    """
+    with open(filename, "wb") as out:
+        if depth is None:
+            depth = FULL_DEPTH
+        out.write(HEADER.pack(MAGIC, dim, depth, int(reverse), len(book)))
+        for key in sorted(book):
+            out.write(RECORD.pack(key, *book[key]))
+
+def book_filename(dim=3, depth=None, reverse=False):
+    """
+    Return the default file name of the book of the given parameters.
+    """
+    name = "poc_ttt_%d" % dim
+    if depth is not None:
+        name += "_depth%d" % depth
+    if reverse:
+        name += "_reverse"
+    return name + ".book"
+
+def load_book(filename=None, dim=3, depth=None, reverse=False):
+    """
+    Open the book in filename, by default named by book_filename after
+    the parameters.  The book is built and written first if the file
+    does not exist or holds a book of other parameters.
+    """
+    if filename is None:
+        filename = book_filename(dim, depth, reverse)
+    if os.path.exists(filename):
+        book = OpeningBook(filename)
+        if book.matches(dim, depth, reverse):
+            return book
+        book.close()
+    write_book(filename, build_book(dim, depth, reverse), dim, depth, reverse)
+    return OpeningBook(filename)
+
+class OpeningBook:
+    """
+    Book file memory-mapped for lookups, which binary search the sorted
+    records without reading the file into memory.
+    """
+    def __init__(self, filename):
+        with open(filename, "rb") as source:
+            self._data = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._dim, depth, reverse, self._count = \
+            HEADER.unpack_from(self._data)
+        if magic != MAGIC:
+            self._data.close()
+            raise ValueError("not an opening book: %s" % filename)
+        self._depth = None if depth == FULL_DEPTH else depth
+        self._reverse = bool(reverse)
+        self._symmetries = board_symmetries(self._dim)
+
+    def __len__(self):
+        """
+        Return the number of positions in the book.
+        """
+        return self._count
+
+    def matches(self, dim, depth=None, reverse=False):
+        """
+        Check whether the book was built with the given parameters.
+        """
+        return (self._dim, self._depth, self._reverse) == (dim, depth, reverse)
+
+    def lookup(self, board, player):
+        """
+        Return the book entry for the board with player to move in the
+        form returned by mm_move, or None if the board is not in the book.
+
+        Boards whose mode cannot be told, as no line can be completed
+        anymore, are taken to be played in the mode of the book, their
+        entry being a draw in either mode.
+        """
+        dim = board.get_dim()
+        if dim != self._dim or board.check_win() is not None or \
+                is_reversed(board, self._reverse) != self._reverse:
+            return None
+        grid = [board.square(row, col) for row in range(dim)
+            for col in range(dim)]
+        key, sym = position_key(grid, player, self._symmetries)
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            found, score, square = RECORD.unpack_from(self._data,
+                HEADER.size + middle * RECORD.size)
+            if found == key:
+                square = self._symmetries[sym][square]
+                return score * SCORES[player], divmod(square, dim)
+            elif found < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def close(self):
+        """
+        Unmap the book file.
+        """
+        self._data.close()
+
+class BookPlayer:
+    """
+    Player answering from an opening book and asking fallback, called
+    like move_wrapper, for positions the book does not hold.
+    """
+    def __init__(self, book, fallback=move_wrapper):
+        self._book = book
+        self._fallback = fallback
+
+    def __call__(self, board, player, trials):
+        """
+        Return the book move, or the fallback's move.
+        """
+        entry = self._book.lookup(board, player)
+        if entry is None:
+            return self._fallback(board, player, trials)
+        return entry[1]
+
+# provided.play_game(BookPlayer(load_book()), 1, False)
+# import poc_ttt_gui
+# poc_ttt_gui.run_gui(3, provided.PLAYERO, BookPlayer(load_book()), 1, False)
@@ -0,0 +1,77 @@
+"""
+Monte Carlo Tic-Tac-Toe Player sharding trials across processes
+"""
+import random
+from multiprocessing import Pool, cpu_count
+import poc_ttt
+
+def run_trials(board, player, trials, seed):
+    """
+    Run trials Monte Carlo trials with random seeded by seed and
+    return the grid of scores.
+    """
+    random.seed(seed)
+    dim = board.get_dim()
+    scores = [[0] * dim for _ in range(dim)]
+    rollout = poc_ttt.RolloutBoard(board)
+    for _ in range(trials):
+        clone = rollout.clone()
+        poc_ttt.mc_trial(clone, player)
+        poc_ttt.mc_update_scores(scores, clone, player)
+    return scores
+
+def _run_trials(args):
+    """
+    Unpack the arguments of run_trials for Pool.map.
+    """
+    return run_trials(*args)
+
+class ParallelMonteCarlo:
+    """
+    Monte Carlo player running the trials of every move in shards on
+    a pool of worker processes kept for the lifetime of the player.
+
+    Shard seeds, and the seed used to break ties between the best
+    squares, are drawn from a generator seeded with seed, so a game
+    replays identically for the same seed.  Call the player like
+    mc_move; close it when the game is over.
+    """
+    def __init__(self, processes=None, seed=0, shards=None):
+        self._pool = Pool(processes)
+        self._shards = shards or processes or cpu_count()
+        self._rng = random.Random(seed)
+
+    def __call__(self, board, player, trials):
+        """
+        Return the move chosen by mc_move.
+        """
+        return self.mc_move(board, player, trials)
+
+    def mc_move(self, board, player, trials):
+        """
+        This function takes a current board, which player the machine player is, and
+        the number of trials to run
+        """
+        shards = max(min(self._shards, trials), 1)
+        tasks = [(board, player, trials // shards + (idx < trials % shards),
+            self._rng.getrandbits(32)) for idx in range(shards)]
+        dim = board.get_dim()
+        scores = [[0] * dim for _ in range(dim)]
+        for shard in self._pool.map(_run_trials, tasks):
+            for row in range(dim):
+                for col in range(dim):
+                    scores[row][col] += shard[row][col]
+
+        state = random.getstate()
+        random.seed(self._rng.getrandbits(32))
+        try:
+            return poc_ttt.get_best_move(board, scores)
+        finally:
+            random.setstate(state)
+
+    def close(self):
+        """
+        Stop the worker processes.
+        """
+        self._pool.close()
+        self._pool.join()
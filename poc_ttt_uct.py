@@ -0,0 +1,174 @@
+"""
+Monte Carlo Tree Search (UCT) Tic-Tac-Toe Player
+"""
+import random
+from array import array
+from math import log, sqrt
+import poc_ttt
+import poc_ttt_provided as provided
+
+EXPLORATION = 1.4
+MAX_NODES = 1000000
+
+class UCTPlayer:
+    """
+    UCT player keeping its search tree between moves.
+
+    Nodes are indices into parallel arrays holding the parent, the
+    square played to reach the node, visits, wins of the player who
+    played that square (draws count half), and the range of children,
+    which are stored consecutively.  After every move the chosen child
+    becomes the root, and on the next call the child matching the
+    opponent's reply does, so statistics carry over.  Call the player
+    like mc_move.
+    """
+    def __init__(self):
+        self._dim = None
+        self._root = None
+        self._root_grid = None
+        self._root_player = None
+        self._parent = array('i')
+        self._square = array('i')
+        self._visits = array('d')
+        self._wins = array('d')
+        self._first_child = array('i')
+        self._child_count = array('i')
+
+    def __call__(self, board, player, trials):
+        """
+        Return the move chosen by uct_move.
+        """
+        return self.uct_move(board, player, trials)
+
+    def uct_move(self, board, player, trials):
+        """
+        This function takes a current board, which player the machine player is, and
+        the number of trials to run
+        """
+        if not board.get_empty_squares():
+            return None
+        self._find_root(board, player)
+        rollout = poc_ttt.RolloutBoard(board)
+        for _ in range(trials):
+            self._search(rollout, player)
+        if not self._child_count[self._root]:
+            self._expand(self._root, board)
+
+        first = self._first_child[self._root]
+        best = max(range(first, first + self._child_count[self._root]),
+            key=lambda child: self._visits[child])
+        square = self._square[best]
+        grid = list(self._root_grid)
+        grid[square] = player
+        self._root, self._root_grid = best, tuple(grid)
+        self._root_player = provided.switch_player(player)
+        return divmod(square, self._dim)
+
+    def _find_root(self, board, player):
+        """
+        Move the root to the node of the given board, or start a new
+        tree if it is not in the tree.
+        """
+        dim = board.get_dim()
+        grid = tuple(board.square(row, col) for row in range(dim)
+            for col in range(dim))
+        if self._root is not None and dim == self._dim and \
+                len(self._parent) < MAX_NODES:
+            diff = [square for square in range(dim * dim)
+                if grid[square] != self._root_grid[square]]
+            if not diff and player == self._root_player:
+                return
+            if len(diff) == 1 and grid[diff[0]] == self._root_player and \
+                    player == provided.switch_player(self._root_player):
+                first = self._first_child[self._root]
+                for child in range(first, first + self._child_count[self._root]):
+                    if self._square[child] == diff[0]:
+                        self._root, self._root_grid = child, grid
+                        self._root_player = player
+                        return
+
+        self.__init__()
+        self._dim = dim
+        self._root = self._new_node(-1, -1)
+        self._root_grid, self._root_player = grid, player
+
+    def _new_node(self, parent, square):
+        """
+        Append a node and return its index.
+        """
+        self._parent.append(parent)
+        self._square.append(square)
+        self._visits.append(0.0)
+        self._wins.append(0.0)
+        self._first_child.append(-1)
+        self._child_count.append(0)
+        return len(self._parent) - 1
+
+    def _expand(self, node, board):
+        """
+        Add a child for every empty square of the node's board.
+        """
+        self._first_child[node] = len(self._parent)
+        for row, col in board.get_empty_squares():
+            self._new_node(node, row * self._dim + col)
+        self._child_count[node] = len(self._parent) - self._first_child[node]
+
+    def _select(self, node):
+        """
+        Return the child with the highest upper confidence bound,
+        unvisited children first.
+        """
+        visits, wins = self._visits, self._wins
+        scale = EXPLORATION * sqrt(log(max(visits[node], 1)))
+        best, best_bound = None, None
+        first = self._first_child[node]
+        for child in range(first, first + self._child_count[node]):
+            if not visits[child]:
+                return child
+            bound = wins[child] / visits[child] + scale / sqrt(visits[child])
+            if best is None or bound > best_bound:
+                best, best_bound = child, bound
+        return best
+
+    def _search(self, board, player):
+        """
+        Run one trial: select a leaf, expand it, play a random game
+        from it and update the statistics along the path.
+        """
+        clone = board.clone()
+        node, to_move = self._root, player
+        path = [node]
+        winner = clone.check_win()
+        while winner is None and self._child_count[node]:
+            node = self._select(node)
+            row, col = divmod(self._square[node], self._dim)
+            clone.move(row, col, to_move)
+            to_move = provided.switch_player(to_move)
+            path.append(node)
+            winner = clone.check_win()
+
+        if winner is None and self._visits[node]:
+            self._expand(node, clone)
+            node = self._first_child[node] + \
+                random.randrange(self._child_count[node])
+            row, col = divmod(self._square[node], self._dim)
+            clone.move(row, col, to_move)
+            to_move = provided.switch_player(to_move)
+            path.append(node)
+            winner = clone.check_win()
+        if winner is None:
+            poc_ttt.mc_trial(clone, to_move)
+            winner = clone.check_win()
+
+        mover = provided.switch_player(player)
+        for node in path:
+            self._visits[node] += 1
+            if winner == mover:
+                self._wins[node] += 1
+            elif winner == provided.DRAW:
+                self._wins[node] += 0.5
+            mover = provided.switch_player(mover)
+
+# provided.play_game(UCTPlayer(), poc_ttt.NTRIALS, False)
+# import poc_ttt_gui
+# poc_ttt_gui.run_gui(3, provided.PLAYERX, UCTPlayer(), poc_ttt.NTRIALS, False)
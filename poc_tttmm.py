@@ -1,18 +1,27 @@
 """
 Mini-max Tic-Tac-Toe Player
 """
-import poc_ttt_gui
+import time
 import poc_ttt_provided as provided
+from poc_ttt import RolloutBoard, is_reversed
 
 # Set timeout, as mini-max can take a long time
-import codeskulptor
-codeskulptor.set_timeout(60)
+try:
+    import codeskulptor
+    codeskulptor.set_timeout(60)
+except ImportError:
+    pass
 
 # SCORING VALUES - DO NOT MODIFY
 SCORES = {provided.PLAYERX: 1,
           provided.DRAW: 0,
           provided.PLAYERO: -1}
 
+# Transposition table entries bound the true score from below, from
+# above or give it exactly.
+EXACT, LOWER, UPPER = 0, 1, 2
+TABLE_SIZE = 2000000
+
 def mm_move(board, player):
     """
     Make a move on the board.
@@ -24,6 +33,8 @@ def mm_move(board, player):
     win = board.check_win()
     if win:
         return SCORES[win], (-1, -1)
+    if not isinstance(board, RolloutBoard):
+        board = RolloutBoard(board)
 
     max_score, max_move = -2, (-1, -1)
     for row, col in board.get_empty_squares():
@@ -35,12 +46,314 @@ def mm_move(board, player):
             key = lambda pair: pair[0])
     return max_score * SCORES[player], max_move
 
+def board_lines(dim):
+    """
+    Return the rows, columns and diagonals of a dim x dim board as lists
+    of flat square indices.
+    """
+    lines = [[row * dim + col for col in range(dim)] for row in range(dim)]
+    lines.extend([[row * dim + col for row in range(dim)] for col in range(dim)])
+    lines.append([idx * dim + idx for idx in range(dim)])
+    lines.append([idx * dim + dim - 1 - idx for idx in range(dim)])
+    return lines
+
+def board_symmetries(dim):
+    """
+    Return the 8 rotations and reflections of a dim x dim board as
+    permutations of the flat square indices: the transformed board has
+    at square i the square perm[i] of the original.
+    """
+    perms = []
+    for transpose in (False, True):
+        for flip_rows in (False, True):
+            for flip_cols in (False, True):
+                perm = []
+                for row in range(dim):
+                    for col in range(dim):
+                        src_row, src_col = (col, row) if transpose else (row, col)
+                        if flip_rows:
+                            src_row = dim - 1 - src_row
+                        if flip_cols:
+                            src_col = dim - 1 - src_col
+                        perm.append(src_row * dim + src_col)
+                perms.append(perm)
+    return perms
+
+class AlphaBeta:
+    """
+    Negamax search with alpha-beta pruning on a flat list of squares.
+
+    Scores are from the point of view of the player to move.  Squares
+    on more lines are tried first, after the best move remembered in
+    the transposition table, which is keyed on the smallest of the 8
+    symmetric copies of the board so that symmetric positions are
+    searched once.  The table is kept between searches; another one may
+    be given, any object with the get, item assignment, len and clear
+    of a dictionary.
+    """
+    def __init__(self, dim, reverse=False, table=None):
+        self._dim = dim
+        self._reverse = reverse
+        squares = range(dim * dim)
+        lines = board_lines(dim)
+        self._lines = [[line for line in lines if square in line]
+            for square in squares]
+        self._order = sorted(squares, key=lambda square: -len(self._lines[square]))
+        self._symmetries = board_symmetries(dim)
+        self._inverses = []
+        for perm in self._symmetries:
+            inverse = [0] * len(perm)
+            for idx, square in enumerate(perm):
+                inverse[square] = idx
+            self._inverses.append(inverse)
+        self._table = {} if table is None else table
+
+    def search(self, grid, player, alpha=-1, beta=1):
+        """
+        Return the score of the flat grid for player to move and the
+        best square, which is None if the grid is full.
+        """
+        if len(self._table) > TABLE_SIZE:
+            self._table.clear()
+        empty = grid.count(provided.EMPTY)
+        if not empty:
+            return 0, None
+        return self._negamax(list(grid), player, empty, alpha, beta)
+
+    def _wins(self, grid, square, player):
+        """
+        Check whether player's mark at square completes a line.
+        """
+        for line in self._lines[square]:
+            if all(grid[other] == player for other in line):
+                return True
+        return False
+
+    def _negamax(self, grid, player, empty, alpha, beta):
+        """
+        Return the score of the grid with empty empty squares and its
+        best square.
+        """
+        key, sym = min((tuple(grid[square] for square in perm), sym)
+            for sym, perm in enumerate(self._symmetries))
+        key = (key, player)
+        perm = self._symmetries[sym]
+        order = self._order
+        entry = self._table.get(key)
+        if entry is not None:
+            value, flag, move = entry
+            move = perm[move]
+            if flag == EXACT:
+                return value, move
+            elif flag == LOWER:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value, move
+            order = [move] + [square for square in order if square != move]
+
+        start_alpha = alpha
+        other = provided.switch_player(player)
+        best, best_square = -2, None
+        for square in order:
+            if grid[square] != provided.EMPTY:
+                continue
+            grid[square] = player
+            if self._wins(grid, square, player):
+                value = -1 if self._reverse else 1
+            elif empty == 1:
+                value = 0
+            else:
+                value = -self._negamax(grid, other, empty - 1, -beta, -alpha)[0]
+            grid[square] = provided.EMPTY
+            if value > best:
+                best, best_square = value, square
+                alpha = max(alpha, value)
+                if alpha >= beta:
+                    break
+
+        if best <= start_alpha:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self._table[key] = (best, flag, self._inverses[sym][best_square])
+        return best, best_square
+
+_SEARCHES = {}
+
+def mm_move_ab(board, player):
+    """
+    Make a move on the board like mm_move, using alpha-beta search with
+    a transposition table kept between calls.
+    """
+    win = board.check_win()
+    if win:
+        return SCORES[win], (-1, -1)
+    dim = board.get_dim()
+    reverse = is_reversed(board)
+    if (dim, reverse) not in _SEARCHES:
+        _SEARCHES[dim, reverse] = AlphaBeta(dim, reverse)
+    grid = [board.square(row, col) for row in range(dim) for col in range(dim)]
+    score, square = _SEARCHES[dim, reverse].search(grid, player)
+    return score * SCORES[player], divmod(square, dim)
+
+def line_heuristic(grid, lines, player):
+    """
+    Score the flat grid for player to move by the lines still open:
+    a line holding marks of only one player counts its marks for that
+    player.  The score is scaled to lie strictly between -1 and 1.
+    """
+    other = provided.switch_player(player)
+    total = 0
+    for line in lines:
+        mine = theirs = 0
+        for square in line:
+            if grid[square] == player:
+                mine += 1
+            elif grid[square] == other:
+                theirs += 1
+        if not theirs:
+            total += mine
+        elif not mine:
+            total -= theirs
+    return total / float(len(lines) * len(lines[0]) + 1)
+
+class _SearchTimeout(Exception):
+    """
+    Raised when the search runs out of its time budget.
+    """
+
+class IterativeDeepening:
+    """
+    Depth-limited alpha-beta search deepened one move at a time.
+
+    Positions at the depth limit are scored by heuristic(grid, lines,
+    player), given the flat grid, the lines of the board as lists of
+    squares and the player to move, which returns a score strictly
+    between -1 and 1 for that player; it is negated in reverse mode.
+    Every iteration first tries the best moves found by the previous
+    one.  With a time_limit in seconds the search stops when the time
+    is up and returns the result of the deepest completed depth.
+    """
+    def __init__(self, depth=None, time_limit=None, heuristic=line_heuristic):
+        self._depth = depth
+        self._time_limit = time_limit
+        self._heuristic = heuristic
+        self._deadline = None
+        self._board_type = None
+        self._reverse = False
+        self._lines = []
+        self._square_lines = []
+        self._order = []
+        self._best = {}
+
+    def __call__(self, board, player, trials):
+        """
+        Return the move chosen by mm_move.
+        """
+        move = self.mm_move(board, player)
+        assert move[1] != (-1, -1), "returned illegal move (-1, -1)"
+        return move[1]
+
+    def mm_move(self, board, player):
+        """
+        Make a move on the board.
+
+        Returns a tuple with two elements.  The first element is the score
+        of the given board and the second element is the desired move as a
+        tuple, (row, col).
+        """
+        win = board.check_win()
+        if win:
+            return SCORES[win], (-1, -1)
+        dim = board.get_dim()
+        reverse = is_reversed(board)
+        if self._board_type != (dim, reverse):
+            self._board_type = (dim, reverse)
+            self._reverse = reverse
+            self._lines = board_lines(dim)
+            self._square_lines = [[line for line in self._lines if square in line]
+                for square in range(dim * dim)]
+            self._order = sorted(range(dim * dim),
+                key=lambda square: -len(self._square_lines[square]))
+            self._best = {}
+        if len(self._best) > TABLE_SIZE:
+            self._best.clear()
+        grid = [board.square(row, col) for row in range(dim) for col in range(dim)]
+        empty = grid.count(provided.EMPTY)
+
+        self._deadline = None
+        if self._time_limit is not None:
+            self._deadline = time.time() + self._time_limit
+        max_depth = empty if self._depth is None else min(self._depth, empty)
+        result = None
+        for depth in range(1, max_depth + 1):
+            try:
+                result = self._negamax(list(grid), player, empty, depth, -1, 1)
+            except _SearchTimeout:
+                break
+            if abs(result[0]) >= 1:
+                break
+        if result is None:
+            square = [square for square in self._order
+                if grid[square] == provided.EMPTY][0]
+            result = self._evaluate(grid, player), square
+        return result[0] * SCORES[player], divmod(result[1], dim)
+
+    def _evaluate(self, grid, player):
+        """
+        Return the heuristic score of the grid for player.
+        """
+        score = self._heuristic(grid, self._lines, player)
+        return -score if self._reverse else score
+
+    def _negamax(self, grid, player, empty, depth, alpha, beta):
+        """
+        Return the score of the grid with empty empty squares searched
+        depth moves deep, and its best square.
+        """
+        if depth == 0:
+            return self._evaluate(grid, player), None
+        if self._deadline is not None and time.time() > self._deadline:
+            raise _SearchTimeout()
+
+        key = (tuple(grid), player)
+        order = self._order
+        hint = self._best.get(key)
+        if hint is not None:
+            order = [hint] + [square for square in order if square != hint]
+        other = provided.switch_player(player)
+        best, best_square = -2, None
+        for square in order:
+            if grid[square] != provided.EMPTY:
+                continue
+            grid[square] = player
+            if any(all(grid[other_square] == player for other_square in line)
+                   for line in self._square_lines[square]):
+                value = -1 if self._reverse else 1
+            elif empty == 1:
+                value = 0
+            else:
+                value = -self._negamax(grid, other, empty - 1, depth - 1,
+                    -beta, -alpha)[0]
+            grid[square] = provided.EMPTY
+            if value > best:
+                best, best_square = value, square
+                alpha = max(alpha, value)
+                if alpha >= beta:
+                    break
+        self._best[key] = best_square
+        return best, best_square
+
 def move_wrapper(board, player, trials):
     """
     Wrapper to allow the use of the same infrastructure that was used
     for Monte Carlo Tic-Tac-Toe.
     """
-    move = mm_move(board, player)
+    move = mm_move_ab(board, player)
     assert move[1] != (-1, -1), "returned illegal move (-1, -1)"
     return move[1]
 
@@ -50,4 +363,6 @@ def move_wrapper(board, player, trials):
 # testing to save time.
 
 # provided.play_game(move_wrapper, 1, False)
+# provided.play_game(IterativeDeepening(time_limit=1.0), 1, False)
+# import poc_ttt_gui
 # poc_ttt_gui.run_gui(3, provided.PLAYERO, move_wrapper, 1, False)
@@ -0,0 +1,198 @@
+"""
+Mini-max Tic-Tac-Toe Player searching the root moves in parallel
+"""
+from ctypes import c_longlong
+from multiprocessing import Array, Pool, RawArray
+import poc_ttt_provided as provided
+from poc_ttt import is_reversed
+from poc_ttt_bitboard import win_masks
+from poc_tttmm import SCORES, AlphaBeta, board_symmetries
+
+TABLE_SLOTS = 1 << 20
+
+# Best score found so far at the root with the smallest square giving
+# it, and the transposition table, shared by the workers.
+_BEST = None
+_TABLE = None
+_SEARCHES = {}
+
+class SharedTable:
+    """
+    Transposition table for AlphaBeta held in an array shared by the
+    worker processes, so that a position reached from several root
+    moves is searched once whichever worker reaches it first.
+
+    Every key hashes to one slot, which keeps the last entry stored in
+    it.  A slot holds the entry packed in one integer and that integer
+    xored with the hash of the key; slots are written without locking,
+    and an entry torn by a concurrent write no longer matches its key,
+    so it is taken to be missing.  The salt keeps tables of different
+    modes apart.
+    """
+    def __init__(self, slots, salt=0):
+        self._slots = slots
+        self._size = len(slots) // 2
+        self._salt = salt
+
+    def __len__(self):
+        """
+        Return the number of slots, the most entries the table holds.
+        """
+        return self._size
+
+    def get(self, key):
+        """
+        Return the (score, flag, square) entry of key, or None.
+        """
+        code = hash((key, self._salt))
+        slot = code % self._size * 2
+        data = self._slots[slot + 1]
+        if self._slots[slot] ^ data != code:
+            return None
+        return (data & 3) - 1, data >> 2 & 3, data >> 4
+
+    def __setitem__(self, key, entry):
+        """
+        Store the (score, flag, square) entry of key.
+        """
+        score, flag, square = entry
+        data = (score + 1) | flag << 2 | square << 4
+        code = hash((key, self._salt))
+        slot = code % self._size * 2
+        self._slots[slot + 1] = data
+        self._slots[slot] = code ^ data
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        for slot in range(len(self._slots)):
+            self._slots[slot] = 0
+
+def _init_worker(best, table):
+    """
+    Keep the shared best root move and table in the worker process.
+    """
+    global _BEST, _TABLE
+    _BEST, _TABLE = best, table
+
+def search_move(dim, reverse, grid, player, square):
+    """
+    Score the move of player to square on the flat grid, for player.
+
+    Only scores better than the best root score found so far by any
+    worker are searched for exactly, or as good as it if square is
+    smaller than the square giving it, so that the smallest square of
+    the best score is found whatever order the workers finish in.
+    Returns a tuple (square, score, exact), score being an upper bound
+    if exact is False.
+    """
+    alpha, best_square = -2, None
+    if _BEST is not None:
+        with _BEST.get_lock():
+            alpha, best_square = _BEST[:]
+        if square < best_square:
+            alpha -= 1
+    grid = list(grid)
+    grid[square] = player
+    mine = sum(1 << idx for idx, status in enumerate(grid) if status == player)
+    if any(mine & line == line for line in win_masks(dim)[1][square]):
+        value = -1 if reverse else 1
+    elif provided.EMPTY not in grid:
+        value = 0
+    elif alpha >= 1:
+        return square, alpha, False
+    else:
+        if (dim, reverse) not in _SEARCHES:
+            table = None
+            if _TABLE is not None:
+                table = SharedTable(_TABLE, (dim, reverse))
+            _SEARCHES[dim, reverse] = AlphaBeta(dim, reverse, table)
+        value = -_SEARCHES[dim, reverse].search(grid,
+            provided.switch_player(player), -1, -alpha)[0]
+        if value <= alpha:
+            return square, value, False
+
+    if _BEST is not None:
+        with _BEST.get_lock():
+            if value > _BEST[0] or value == _BEST[0] and square < _BEST[1]:
+                _BEST[:] = [value, square]
+    return square, value, True
+
+def _search_move(args):
+    """
+    Unpack the arguments of search_move for Pool.map.
+    """
+    return search_move(*args)
+
+def root_moves(grid, dim):
+    """
+    Return the empty squares of the flat grid that are not the mirror
+    image of a smaller one under a rotation or reflection leaving the
+    grid unchanged.
+    """
+    symmetries = [perm for perm in board_symmetries(dim)
+        if all(grid[perm[square]] == grid[square] for square in range(dim * dim))]
+    return sorted(set(min(perm[square] for perm in symmetries)
+        for square in range(dim * dim) if grid[square] == provided.EMPTY))
+
+class ParallelMinimax:
+    """
+    Mini-max player scoring every root move in its own task on a pool
+    of worker processes, each running alpha-beta search on a
+    transposition table shared by all of them.
+
+    Root moves that mirror a smaller square are left out.  Moves on
+    more lines are handed out first and a task only searches for scores
+    better than the best finished so far, so later moves are cut short
+    like in the serial search.  Of the moves with the best score the one
+    on the smallest square is returned, as mm_move does.  Call the
+    player like move_wrapper; close it when the game is over.
+    """
+    def __init__(self, processes=None):
+        self._best = Array("i", 2)
+        self._table = RawArray(c_longlong, 2 * TABLE_SLOTS)
+        self._pool = Pool(processes, _init_worker, (self._best, self._table))
+
+    def __call__(self, board, player, trials):
+        """
+        Return the move chosen by mm_move.
+        """
+        move = self.mm_move(board, player)
+        assert move[1] != (-1, -1), "returned illegal move (-1, -1)"
+        return move[1]
+
+    def mm_move(self, board, player):
+        """
+        Make a move on the board.
+
+        Returns a tuple with two elements.  The first element is the score
+        of the given board and the second element is the desired move as a
+        tuple, (row, col).
+        """
+        win = board.check_win()
+        if win:
+            return SCORES[win], (-1, -1)
+        dim = board.get_dim()
+        reverse = is_reversed(board)
+        grid = [board.square(row, col) for row in range(dim)
+            for col in range(dim)]
+        square_masks = win_masks(dim)[1]
+        squares = sorted(root_moves(grid, dim),
+            key=lambda square: -len(square_masks[square]))
+
+        self._best[:] = [-2, dim * dim]
+        tasks = [(dim, reverse, grid, player, square) for square in squares]
+        best_score, best_square = -2, None
+        for square, score, exact in self._pool.map(_search_move, tasks, 1):
+            if exact and (score > best_score or
+                          score == best_score and square < best_square):
+                best_score, best_square = score, square
+        return best_score * SCORES[player], divmod(best_square, dim)
+
+    def close(self):
+        """
+        Stop the worker processes.
+        """
+        self._pool.close()
+        self._pool.join()
@@ -1,12 +1,15 @@
 """
 Student code for Word Wrangler game
 """
-import urllib2
-import codeskulptor
+from bisect import bisect_left
 import poc_wrangler_provided as provided
 
 WORDFILE = "assets_scrabble_words3.txt"
 
+# intersect gallops through the longer list when it is at least this
+# many times longer than the other one.
+GALLOP_RATIO = 8
+
 # Functions to manipulate ordered word lists
 
 def remove_duplicates(list1):
@@ -18,11 +21,21 @@ def remove_duplicates(list1):
 
     This function can be iterative.
     """
-    result = []
-    for element in list1:
-        if not result or result[-1] != element:
-            result.append(element)
-    return result
+    return list(iter_remove_duplicates(list1))
+
+def iter_remove_duplicates(iterable):
+    """
+    Eliminate duplicates in a sorted iterable.
+
+    Generates the elements of iterable, skipping those equal to the
+    previous one, without building a list.
+    """
+    end = object()
+    previous = end
+    for element in iterable:
+        if previous is end or previous != element:
+            yield element
+            previous = element
 
 def intersect(list1, list2):
     """
@@ -33,9 +46,15 @@ def intersect(list1, list2):
 
     This function can be iterative.
     """
+    if len(list1) > len(list2):
+        list1, list2 = list2, list1
+    if len(list1) * GALLOP_RATIO <= len(list2):
+        return list(intersect_gallop(list1, list2))
+
     result = []
     index1, index2 = 0, 0
-    while index1 < len(list1) and index2 < len(list2):
+    len1, len2 = len(list1), len(list2)
+    while index1 < len1 and index2 < len2:
         if list1[index1] < list2[index2]:
             index1 += 1
         elif list1[index1] > list2[index2]:
@@ -46,6 +65,58 @@ def intersect(list1, list2):
             index2 += 1
     return result
 
+def gallop(items, value, low=0):
+    """
+    Find value in the sorted list items from index low on.
+
+    Returns the index of the first element not less than value,
+    probing low, low + 1, low + 3, low + 7, ... before bisecting the
+    last interval, so values close to low are found quickly.
+    """
+    size = len(items)
+    high, step = low, 1
+    while high < size and items[high] < value:
+        low = high + 1
+        high += step
+        step *= 2
+    return bisect_left(items, value, low, min(high, size))
+
+def intersect_gallop(small, large):
+    """
+    Compute the intersection of two sorted lists, small being much
+    shorter than large.
+
+    Generates the elements of small that are in large, galloping
+    through large from the position of the previous element.
+    """
+    index = 0
+    for element in small:
+        index = gallop(large, element, index)
+        if index == len(large):
+            return
+        if large[index] == element:
+            yield element
+            index += 1
+
+def iter_intersect(iterable1, iterable2):
+    """
+    Compute the intersection of two sorted iterables.
+
+    Generates the elements that are in both iterable1 and iterable2,
+    like intersect, reading each only as far as needed.
+    """
+    iter1, iter2 = iter(iterable1), iter(iterable2)
+    end = object()
+    item1, item2 = next(iter1, end), next(iter2, end)
+    while item1 is not end and item2 is not end:
+        if item1 < item2:
+            item1 = next(iter1, end)
+        elif item1 > item2:
+            item2 = next(iter2, end)
+        else:
+            yield item1
+            item1, item2 = next(iter1, end), next(iter2, end)
+
 # Functions to perform merge sort
 
 def merge(list1, list2):
@@ -113,6 +184,8 @@ def load_words(filename):
 
     Returns a list of strings.
     """
+    import urllib2
+    import codeskulptor
     url = codeskulptor.file2url(filename)
     net_file = urllib2.urlopen(url)
     return net_file.read().splitlines()
@@ -127,4 +200,5 @@ def run():
                                      gen_all_strings)
     provided.run_game(wrangler)
 
-run()
+if __name__ == "__main__":
+    run()